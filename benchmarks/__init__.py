@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Compare the `bzr` subprocess backend with the breezy based ones.
+
+A shared repository of N local branches is created with breezy and
+the README.gNewSense of every branch is read with each backend: `bzr`
+runs `brz` through a `bzr` symlink once per package, `helper` runs J
+long-lived helpers and `breezy` reads in-process. Needs breezy;
+run from the top-level directory:
+
+    python -m benchmarks.bench_backends [--pkgs N] [--jobs J]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from io import StringIO
+from unittest import mock
+
+import gd_diff
+
+readme = ('Changed-From-Debian: Removed non-free documentation.\n'
+          'Change-Type: Deblob\n')
+
+
+def make_branches(root, release, pkgs):
+    """Create a branch with a README.gNewSense for each of `pkgs`."""
+    from breezy import controldir, workingtree
+    from breezy.commit import NullCommitReporter
+
+    controldir.ControlDir.create(root).create_repository(shared=True)
+    for pkg in pkgs:
+        bpath = os.path.join(root, 'packages-{}'.format(release), pkg)
+        os.makedirs(os.path.join(bpath, 'debian'))
+        with open(os.path.join(bpath, 'debian', 'README.gNewSense'),
+                  'w') as f:
+            f.write(readme)
+
+        controldir.ControlDir.create_branch_convenience(
+            'file://' + bpath, force_new_tree=True)
+        tree = workingtree.WorkingTree.open(bpath)
+        tree.add(['debian', 'debian/README.gNewSense'])
+        tree.commit('Import', committer='gd-diff <gd-diff@example.org>',
+                    reporter=NullCommitReporter())
+
+
+def fetch_all(release, pkgs, backend, jobs):
+    """Read the README of every package in `pkgs` with `backend`."""
+    found = gd_diff.map_gns_readmes(release, pkgs,
+                                    lambda pkg, content: content, jobs=jobs,
+                                    writer=lambda *args: None,
+                                    backend=backend)
+    return sum(1 for c in found if c is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pkgs', type=int, default=200)
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+
+    brz = shutil.which('brz')
+    try:
+        gd_diff.import_breezy()
+    except ImportError:
+        brz = None
+    if brz is None:
+        print('breezy is not installed', file=sys.stderr)
+        sys.exit(1)
+
+    release = 'parkes'
+    pkgs = ['pkg-{}'.format(i) for i in range(args.pkgs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'repo')
+        bin_dir = os.path.join(tmp, 'bin')
+        os.makedirs(bin_dir)
+        os.symlink(brz, os.path.join(bin_dir, 'bzr'))
+
+        make_branches(root, release, pkgs)
+
+        env = {'HOME': tmp,
+               'PATH': os.pathsep.join([bin_dir, os.environ['PATH']])}
+        branch_url = 'file://' + root + '/packages-{}/{}'
+
+        with mock.patch.dict('os.environ', env), \
+             mock.patch('gd_diff.branch_url_fmt', new=branch_url), \
+             mock.patch('sys.stdout', new=StringIO()):
+            results = []
+            for name in ['bzr', 'helper', 'breezy']:
+                backend = gd_diff.open_backend(name, args.jobs)
+                start = time.perf_counter()
+                found = fetch_all(release, pkgs, backend, args.jobs)
+                elapsed = time.perf_counter() - start
+                backend.close()
+                results.append((name, found, elapsed))
+
+    for name, found, elapsed in results:
+        print('{:<7} {:6d} READMEs {:8.3f} s {:8.2f} ms/pkg'.format(
+            name, found, elapsed, elapsed * 1000 / len(pkgs)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Compare README field extraction on synthetic READMEs.
+
+`slurp_fields_from_readme`, which compiles each field's pattern once,
+is timed against building the patterns on every call.
+
+Run from the top-level directory:
+
+    python -m benchmarks.bench_fields [--readmes N]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from gd_diff import field_list, slurp_fields_from_readme
+
+
+def synthetic_readmes(n, seed=0):
+    """Return `n` README.gNewSense like strings."""
+    rand = random.Random(seed)
+    change_types = ['Modified', 'Deblob', 'Branding', 'Removed', '']
+    prose = ('For gNewSense, the non-free files are removed from the '
+             'source package. See README.source for details.\n')
+
+    readmes = []
+    for i in range(n):
+        lines = [
+            'Changed-From-Debian: Removed non-free file #{}.'.format(i),
+            'Change-Type: {}'.format(rand.choice(change_types)),
+        ]
+        rand.shuffle(lines)
+        readmes.append('\n'.join(lines) + '\n\n' +
+                       prose * rand.randint(1, 20))
+
+    return readmes
+
+
+def uncompiled_slurp(content, fields):
+    """Slurp `fields` from `content`, building each pattern on every call."""
+    field_values = {}
+    for field in fields:
+        pattern = r'{}:[ ]*(.+)'.format(field)
+        field_pattern = re.compile(pattern)
+        field_match = field_pattern.search(content)
+
+        if (field_match and
+            field_match.group(1) and
+            field_match.group(1).strip()):
+            field_values[field] = field_match.group(1).strip()
+        else:
+            field_values[field] = None
+
+    return field_values
+
+
+def bench(readmes, fields):
+    """Print time taken to slurp `fields` from `readmes`."""
+    print('{} READMEs, fields: {}'.format(len(readmes), ', '.join(fields)))
+
+    results = {}
+    for name, func in [('uncompiled', uncompiled_slurp),
+                       ('precompiled', slurp_fields_from_readme)]:
+        start = time.perf_counter()
+        results[name] = [func(readme, fields) for readme in readmes]
+        elapsed = time.perf_counter() - start
+        print('  {:<12} {:8.3f} s {:10.1f} us/README'.format(
+            name, elapsed, elapsed / len(readmes) * 1e6))
+
+    assert results['uncompiled'] == results['precompiled']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readmes', type=int, default=5000)
+    args = parser.parse_args()
+
+    readmes = synthetic_readmes(args.readmes)
+
+    bench(readmes, field_list)
+    # extra fields that are missing from the READMEs.
+    bench(readmes, field_list + ['Upstream-Bug', 'Removed-Files'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Run the whole `gd-diff RELEASE VERSION` pipeline offline.
+
+The package listing, the bzr branches and the wiki are replaced by
+the fakes in `benchmarks.fakes`. Each release size is run in a fresh
+HOME and its throughput is reported with the `--stats` of the run.
+Run from the top-level directory:
+
+    python -m benchmarks.bench_make_push [--sizes 100,1000,10000,50000]
+        [--latency S] [--failure-rate F] [--gd-diff-args ARGS]
+
+ARGS are extra gd-diff options; they default to `-j 8 --backend bzr`
+so that the fake bzr is used even when breezy is installed.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import sys
+import tempfile
+
+from io import StringIO
+from unittest import mock
+
+import gd_diff
+
+from benchmarks.fakes import (install_fake_bzr, LoggerheadServer,
+                              WikiServer)
+
+
+def run_gd_diff(size, gd_diff_args, env):
+    """Run gd-diff on a release with `size` packages; return its stats."""
+    release = 'r{}'.format(size)
+
+    with tempfile.TemporaryDirectory() as home:
+        stats_file = os.path.join(home, 'stats.json')
+        argv = (['gd-diff', '--stats', stats_file] + gd_diff_args +
+                [release, '3'])
+        env = dict(env, HOME=home)
+
+        with mock.patch.dict('os.environ', env), \
+             mock.patch('sys.argv', new=argv), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            gd_diff.write_file(gd_diff.config_file(),
+                               json.dumps({'user': 'u', 'pass': 'p'}))
+            gd_diff.stats.reset()
+            gd_diff.main()
+
+        return json.loads(gd_diff.read_file(stats_file))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100,1000',
+                        help='comma separated release sizes')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds each fake bzr command takes')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='fraction of fake bzr commands that fail')
+    parser.add_argument('--gd-diff-args', default='-j 8 --backend bzr',
+                        help='extra gd-diff options')
+    args = parser.parse_args()
+
+    listing = LoggerheadServer()
+    wiki = WikiServer()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = install_fake_bzr(os.path.join(tmp, 'bin'))
+        env = {
+            'PATH': os.pathsep.join([bin_dir, os.environ['PATH']]),
+            'FAKE_BZR_LATENCY': str(args.latency),
+            'FAKE_BZR_FAILURE_RATE': str(args.failure_rate),
+        }
+        lh = listing.url + '/lh/gnewsense/packages-{}'
+
+        with mock.patch('gd_diff.pkgs_list_url_fmt', new=lh + '/'), \
+             mock.patch('gd_diff.readme_download_fmt',
+                        new=lh + '/{}/download/head:/debian/'
+                        'README.gNewSense'), \
+             mock.patch('gd_diff.gns_wiki', new=wiki.url):
+            print('{:>7} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+                'pkgs', 'wall s', 'cpu s', 'pkgs/s', 'p50 ms', 'p95 ms',
+                'p99 ms'))
+            for size in [int(s) for s in args.sizes.split(',')]:
+                wiki.pages = {}
+                report = run_gd_diff(size, shlex.split(args.gd_diff_args),
+                                     env)
+                assert len(wiki.pages) == 1, 'wiki page not pushed'
+
+                fetch = report['latencies'].get('fetch', {})
+                print('{:>7} {:9.2f} {:9.2f} {:9.0f} {:>9} {:>9} {:>9}'
+                      .format(size, report['wall'], report['cpu'],
+                              size / report['wall'],
+                              *['{:.1f}'.format(fetch[p] * 1000)
+                                if p in fetch else '-'
+                                for p in ['p50', 'p95', 'p99']]))
+                sys.stdout.flush()
+
+    listing.shutdown()
+    wiki.shutdown()
+
+
+if __name__ == '__main__':
+    main()
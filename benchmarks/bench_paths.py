@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Count filesystem syscalls made to save and read back READMEs.
+
+`os.stat`, `os.mkdir` and `open` are wrapped with counters, so no
+strace is needed. Run from the top-level directory:
+
+    python -m benchmarks.bench_paths [--pkgs N]
+"""
+
+import argparse
+import builtins
+import os
+import tempfile
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
+
+import gd_diff
+
+
+@contextmanager
+def count_syscalls():
+    """Count calls to `os.stat`, `os.mkdir` and `open` in the block."""
+    counts = Counter()
+
+    def counted(name, func):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    with mock.patch('os.stat', new=counted('stat', os.stat)), \
+         mock.patch('os.mkdir', new=counted('mkdir', os.mkdir)), \
+         mock.patch('builtins.open', new=counted('open', builtins.open)):
+        yield counts
+
+
+def save_and_read(release, pkgs, store):
+    """Save and read back a README for each package in `pkgs`."""
+    for pkg in pkgs:
+        gd_diff.save_gns_readme('Change-Type: Modified\n', release, pkg,
+                                store)
+        gd_diff.read_gns_readme(release, pkg, store)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pkgs', type=int, default=2000)
+    args = parser.parse_args()
+
+    pkgs = ['pkg-{}'.format(i) for i in range(args.pkgs)]
+
+    with tempfile.TemporaryDirectory() as home, \
+         mock.patch.dict('os.environ', {'HOME': home}), \
+         mock.patch('sys.stdout', new=StringIO()):
+        # each run uses its own release so that both create directories.
+        runs = [
+            ('per-call', 'parkes', lambda: None),
+            ('resolved', 'ucclia', lambda: gd_diff.TreeStore(
+                gd_diff.resolve_paths('ucclia'))),
+        ]
+
+        results = []
+        for name, release, mk_store in runs:
+            store = mk_store()
+            with count_syscalls() as counts:
+                start = time.perf_counter()
+                save_and_read(release, pkgs, store)
+                elapsed = time.perf_counter() - start
+            results.append((name, counts, elapsed))
+
+    for name, counts, elapsed in results:
+        print('{:<9} {:6.0f} stat {:6.0f} mkdir {:6.0f} open'
+              ' per 1000 pkgs {:8.3f} s'.format(
+                  name, *[counts[c] * 1000 / len(pkgs)
+                          for c in ['stat', 'mkdir', 'open']], elapsed))
+
+
+if __name__ == '__main__':
+    main()
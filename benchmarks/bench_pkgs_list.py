@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Compare package listing parsers on a synthetic listing.
+
+Run from the top-level directory:
+
+    python -m benchmarks.bench_pkgs_list [--rows N]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fakes import synthetic_listing
+from gd_diff import iter_packages
+
+
+def bs4_packages(html):
+    """Slurp packages from `html` the way `get_packages` used to."""
+    html_forest = BeautifulSoup(html, 'html.parser')
+
+    pkgs = ''
+    for td in html_forest.find_all('td', class_='autcell'):
+        pkgs += td.a.string.strip() + '\n'
+
+    return pkgs
+
+
+def streaming_packages(html):
+    """Slurp packages from `html` the way `get_packages` does."""
+    return ''.join([pkg + '\n' for pkg in iter_packages(html)])
+
+
+def measure(func, html):
+    """Return (seconds, peak bytes, result) of `func(html)`.
+
+    Time and memory are measured in separate runs as tracing memory
+    allocations slows `func` down.
+    """
+    start = time.perf_counter()
+    result = func(html)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    html = synthetic_listing(args.rows)
+
+    results = {}
+    for name, func in [('bs4', bs4_packages),
+                       ('streaming', streaming_packages)]:
+        elapsed, peak, results[name] = measure(func, html)
+        print('{:<10} {:8.3f} s {:10.1f} MiB peak'.format(
+            name, elapsed, peak / 2**20))
+
+    assert results['bs4'] == results['streaming']
+
+
+if __name__ == '__main__':
+    main()
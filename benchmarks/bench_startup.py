@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Measure how long `import gd_diff` takes with `python -X importtime`.
+
+gd_diff is imported RUNS times in fresh interpreters and the fastest
+cumulative import time is reported with the slowest modules it
+pulled in. Exits with status 1 if the import takes longer than MS
+milliseconds or if it imports any of the modules that gd_diff only
+loads on the code paths that need them. Run from the top-level
+directory:
+
+    python -m benchmarks.bench_startup [--runs RUNS] [--max-ms MS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# modules that must not be imported by `import gd_diff`.
+lazy_modules = [
+    'asyncio',
+    'pkg_resources',
+    'requests',
+    'sqlite3',
+    'urllib3',
+    'xmlrpc.client',
+]
+
+
+def import_times():
+    """Import gd_diff in a new interpreter; return its import times.
+
+    Returns a dict mapping each imported module to its cumulative import
+    time in microseconds.
+    """
+    env = dict(os.environ)
+    # let the warm up run write bytecode so that it is not measured.
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    cp = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                         'import gd_diff'],
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        env=env, check=True)
+
+    times = {}
+    for line in cp.stderr.decode().splitlines():
+        if not line.startswith('import time:'):
+            continue
+        cols = line[len('import time:'):].split('|')
+        if not cols[0].strip().isdigit():
+            continue # header.
+        times[cols[2].strip()] = int(cols[1])
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10,
+                        help='number of imports to time')
+    parser.add_argument('--max-ms', type=float, default=150,
+                        help='fail if importing gd_diff takes longer')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of slowest modules to show')
+    args = parser.parse_args()
+
+    import_times() # warm up.
+    runs = [import_times() for _ in range(args.runs)]
+    best = min(runs, key=lambda times: times['gd_diff'])
+
+    total = best['gd_diff'] / 1000
+    print('import gd_diff: {:.1f} ms (best of {})'.format(total, args.runs))
+    for name, us in sorted(best.items(), key=lambda i: -i[1])[:args.top]:
+        print('{:>9.1f} ms  {}'.format(us / 1000, name))
+
+    failed = False
+    imported = sorted(set(lazy_modules) & set(best))
+    if imported:
+        print('FAIL: gd_diff imports {}'.format(', '.join(imported)),
+              file=sys.stderr)
+        failed = True
+    if total > args.max_ms:
+        print('FAIL: import takes more than {} ms'.format(args.max_ms),
+              file=sys.stderr)
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Fake `bzr` serving synthetic package branches for the benchmarks.
+
+Any branch `.../packages-RELEASE/PKG` exists. Whether PKG has a
+README.gNewSense, and its content, is derived from PKG's name; see
+`synthetic_readme`. Supports `bzr cat URL` and `bzr revision-info -d
+URL`. It is tuned with environment variables:
+
+    FAKE_BZR_LATENCY       seconds each command sleeps; default 0
+    FAKE_BZR_FAILURE_RATE  fraction of commands that fail; default 0
+
+Install it on PATH with `benchmarks.fakes.install_fake_bzr`.
+"""
+
+import hashlib
+import os
+import random
+import sys
+import time
+
+from urllib.parse import urlparse
+
+# fraction of packages that have a README.gNewSense.
+readme_rate = 0.2
+
+change_types = ['Modified', 'Deblob', 'Removed', 'Added']
+
+
+def pkg_hash(pkg):
+    return int(hashlib.sha1(pkg.encode()).hexdigest(), 16)
+
+
+def synthetic_readme(pkg):
+    """Return README.gNewSense of `pkg` as bytes; None if it has none."""
+    h = pkg_hash(pkg)
+    if h % 1000 >= readme_rate * 1000:
+        return None
+
+    return ('Changed-From-Debian: Removed non-free bits of {}.\n'
+            'Change-Type: {}\n'.format(
+                pkg, change_types[h % len(change_types)])).encode()
+
+
+def branch_pkg(url):
+    """Return package name of branch `url`, or of a file in it."""
+    parts = urlparse(url).path.split('/')
+    for i, part in enumerate(parts):
+        if part.startswith('packages-'):
+            return parts[i + 1]
+
+    return None
+
+
+def error(msg):
+    print('bzr: ERROR: {}'.format(msg), file=sys.stderr)
+    sys.exit(3)
+
+
+def main(args):
+    time.sleep(float(os.environ.get('FAKE_BZR_LATENCY', 0)))
+    if random.random() < float(os.environ.get('FAKE_BZR_FAILURE_RATE', 0)):
+        error('Connection error: Connection reset by peer')
+
+    if args[:1] == ['cat']:
+        pkg = branch_pkg(args[1])
+        content = synthetic_readme(pkg) if pkg else None
+        if content is None:
+            error('"{}" is not present in revision 1.'.format(args[1]))
+        sys.stdout.buffer.write(content)
+    elif args[:2] == ['revision-info', '-d']:
+        pkg = branch_pkg(args[2])
+        if pkg is None:
+            error('Not a branch: "{}".'.format(args[2]))
+        print('1 fake-{:x}'.format(pkg_hash(pkg)))
+    else:
+        error('unknown command "{}"'.format(' '.join(args)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Offline stand-ins for the services gd-diff talks to.
+
+- `install_fake_bzr` puts `benchmarks/fake_bzr.py` on PATH as `bzr`.
+- `LoggerheadServer` serves synthetic package listings and READMEs
+  the way Savannah's loggerhead does.
+- `WikiServer` is a MoinMoin like XML-RPC server that accepts pages.
+"""
+
+import os
+import re
+import stat
+import sys
+import threading
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+from benchmarks.fake_bzr import synthetic_readme
+
+
+def synthetic_pkgs(rows):
+    """Return names of `rows` synthetic packages."""
+    return ['pkg-{}'.format(i) for i in range(rows)]
+
+
+def synthetic_listing(rows):
+    """Return loggerhead like package listing with `rows` packages."""
+    row = ('<tr class="blueRow{0}"><td class="autcell">'
+           '<a href="/lh/gnewsense/packages-parkes/{1}/files">{1}</a>'
+           '</td><td class="date">2016-01-01 10:00:00</td>'
+           '<td class="message">Merge from upstream.</td></tr>\n')
+    table = ''.join([row.format(i % 2, pkg)
+                     for i, pkg in enumerate(synthetic_pkgs(rows))])
+
+    return '<html><body><table>\n{}</table></body></html>'.format(table)
+
+
+def install_fake_bzr(bin_dir):
+    """Install fake `bzr` in `bin_dir`; return `bin_dir`.
+
+    The fake runs under this interpreter.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'fake_bzr.py')
+    bzr = os.path.join(bin_dir, 'bzr')
+
+    os.makedirs(bin_dir, exist_ok=True)
+    with open(bzr, 'w') as f:
+        f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable,
+                                                          script))
+    os.chmod(bzr, os.stat(bzr).st_mode | stat.S_IXUSR)
+
+    return bin_dir
+
+
+def serve(server):
+    """Serve `server` in a daemon thread; set and return its `url`."""
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+
+    return server
+
+
+class LoggerheadHandler(BaseHTTPRequestHandler):
+    """Serves synthetic listings and README downloads.
+
+    The listing of release `rN` at `/lh/gnewsense/packages-rN/` has N
+    packages. READMEs are served at
+    `/lh/gnewsense/packages-R/PKG/download/head:/debian/README.gNewSense`.
+    """
+    protocol_version = 'HTTP/1.1'
+    listing_re = re.compile(r'^/lh/gnewsense/packages-r(\d+)/$')
+    readme_re = re.compile(r'^/lh/gnewsense/packages-[^/]+/([^/]+)/download/'
+                           r'head:/debian/README.gNewSense$')
+
+    def do_GET(self):
+        m = self.listing_re.match(self.path)
+        if m:
+            return self.reply(200, self.server.listing(int(m.group(1))))
+
+        m = self.readme_re.match(self.path)
+        content = synthetic_readme(m.group(1)) if m else None
+        if content is None:
+            return self.reply(404, b'not found')
+
+        self.reply(200, content)
+
+    def reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LoggerheadServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), LoggerheadHandler)
+        self.listings = {}
+        serve(self)
+
+
+    def listing(self, rows):
+        if rows not in self.listings:
+            self.listings[rows] = synthetic_listing(rows).encode()
+
+        return self.listings[rows]
+
+
+class WikiHandler(SimpleXMLRPCRequestHandler):
+    # MoinMoin serves XML-RPC at `?action=xmlrpc2` of any page.
+    rpc_paths = ()
+
+    def log_message(self, *args):
+        pass
+
+
+class WikiServer(SimpleXMLRPCServer):
+    """MoinMoin like XML-RPC server; pushed pages are kept in `pages`."""
+    token = 'bench-token'
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), WikiHandler, allow_none=True,
+                         logRequests=False)
+        self.pages = {}
+        self.register_multicall_functions()
+        self.register_function(lambda user, passwd: self.token,
+                               'getAuthToken')
+        self.register_function(lambda token: 'SUCCESS', 'applyAuthToken')
+        self.register_function(self.put_page, 'putPage')
+        serve(self)
+
+
+    def put_page(self, name, content):
+        self.pages[name] = content
+        return True
@@ -7,22 +7,28 @@
 #  <https://creativecommons.org/publicdomain/zero/1.0>
 
 import argparse
+import hashlib
+import io
 import json
 import os
+import queue
 import re
 import shlex
+import signal
 import sys
-import xmlrpc.client
-
-import requests
-
+import threading
+import time
+
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from html.parser import HTMLParser
 from os import path
-from subprocess import run, PIPE
-from urllib.parse import urljoin
-from xmlrpc.client import ServerProxy, MultiCall, Fault, ProtocolError
+from subprocess import run, CompletedProcess, PIPE, Popen, TimeoutExpired
+from urllib.parse import urljoin, urlparse
 
-from bs4 import BeautifulSoup
-from pkg_resources import resource_string
+import gns_deb_diff
 
 from gns_deb_diff._version import __version__
 
@@ -32,17 +38,58 @@ field_list = [
     'Changed-From-Debian',
 ]
 
+# compiled field patterns; see `field_pattern`.
+_field_patterns = {}
+
 # urls
 sv_bzr_http = 'http://bzr.savannah.gnu.org'
 sv_bzr_gns = '/'.join(['bzr://bzr.savannah.gnu.org', 'gnewsense'])
 gns_wiki = 'http://gnewsense.org'
 
+# http
+http_timeout = (10, 60) # connect and read timeouts in seconds.
+http_retries = 3
+http_pool_size = 32
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# fetches; see `FetchPolicy`.
+fetch_backoff = 1 # seconds before the first retry of a timed out command.
+hedge_window = 1000 # number of latest commands the hedging p95 is of.
+hedge_min_samples = 20
+
+# adaptive concurrency; see `AdaptiveLimiter`.
+adaptive_window = 20 # fetches per adjustment of the limit.
+baseline_windows = 10 # windows the latency baseline is the lowest of.
+latency_tolerance = 2.0
+
+# bzr errors that mean the branch or file does not exist; other errors
+# are fetch failures.
+missing_error_re = re.compile(r'not a branch|is not present in revision|'
+                              r'no such file|does not exist', re.IGNORECASE)
+
+# requests and errors of the fetches run by each thread; see
+# `note_fetch_request` and `note_fetch_error`.
+_fetch_counts = threading.local()
+
+# seconds between polls of the `WorkQueue`.
+work_queue_poll = 1
+
+# breezy module; see `import_breezy`.
+_breezy = None
+_breezy_lock = threading.Lock()
+
 # fmt
+pkgs_list_url_fmt = '/'.join([sv_bzr_http, 'lh', 'gnewsense',
+                              'packages-{}', ''])
 readme_link_fmt = '/'.join([sv_bzr_http, 'lh', 'gnewsense',
                             'packages-{}', '{}', 'annotate',
                             'head:', 'debian', 'README.gNewSense'])
-readme_url_fmt = '/'.join([sv_bzr_gns, 'packages-{}', '{}','debian',
-                           'README.gNewSense'])
+readme_download_fmt = '/'.join([sv_bzr_http, 'lh', 'gnewsense',
+                                'packages-{}', '{}', 'download',
+                                'head:', 'debian', 'README.gNewSense'])
+branch_url_fmt = '/'.join([sv_bzr_gns, 'packages-{}', '{}'])
 
 
 def read_file(fpath):
@@ -73,15 +120,18 @@ def write_file(fpath, content):
         exit(1)
 
 
-def execute(cmd, out=None, err=None):
+def execute(cmd, out=None, err=None, timeout=None):
     """Run `cmd`. Returns an instance of `subprocess.CompletedProcess`
 
-    `cmd` must be a string containing the command to run.
+    `cmd` must be a string containing the command to run. If `timeout`
+    is given and `cmd` runs longer than `timeout` seconds, it is killed
+    and `subprocess.TimeoutExpired` is raised.
     """
     cmd = shlex.split(cmd)
+    stats.count('subprocesses')
 
     try:
-        completed_process = run(cmd, stdout=out, stderr=err)
+        completed_process = run(cmd, stdout=out, stderr=err, timeout=timeout)
     except (FileNotFoundError, OSError, ValueError) as e:
         print("Error running '%s'\n Error Info:\n %r" % (cmd[0], e),
               file=sys.stderr)
@@ -90,6 +140,240 @@ def execute(cmd, out=None, err=None):
     return completed_process
 
 
+async def aexecute(cmd):
+    """Coroutine version of `execute`.
+
+    Runs `cmd` with its stdout and stderr piped and returns an instance
+    of `subprocess.CompletedProcess`.
+    """
+    import asyncio
+
+    cmd = shlex.split(cmd)
+    stats.count('subprocesses')
+
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE,
+                                                    stderr=PIPE)
+    except (FileNotFoundError, OSError, ValueError) as e:
+        print("Error running '%s'\n Error Info:\n %r" % (cmd[0], e),
+              file=sys.stderr)
+        sys.exit(1)
+
+    out, err = await proc.communicate()
+
+    return CompletedProcess(cmd, proc.returncode, out, err)
+
+
+def execute_hedged(cmd, timeout=None, hedge_after=None):
+    """Run `cmd` with its output piped; hedge it if it is slow.
+
+    If `hedge_after` is given and `cmd` has not finished after that many
+    seconds, a duplicate of `cmd` is started. The first to finish wins
+    and the other is killed. Both are killed once `timeout` seconds
+    have passed since `cmd` started.
+
+    Returns an instance of `subprocess.CompletedProcess`; None if `cmd`
+    timed out.
+    """
+    if hedge_after is None or (timeout is not None and hedge_after >= timeout):
+        try:
+            return execute(cmd, out=PIPE, err=PIPE, timeout=timeout)
+        except TimeoutExpired:
+            return None
+
+    args = shlex.split(cmd)
+    finished = queue.Queue()
+    procs = []
+
+    def start():
+        stats.count('subprocesses')
+        try:
+            p = Popen(args, stdout=PIPE, stderr=PIPE)
+        except (FileNotFoundError, OSError, ValueError) as e:
+            print("Error running '%s'\n Error Info:\n %r" % (args[0], e),
+                  file=sys.stderr)
+            sys.exit(1)
+        procs.append(p)
+
+        def wait():
+            out, err = p.communicate()
+            finished.put((p, CompletedProcess(args, p.returncode, out, err)))
+        threading.Thread(target=wait, daemon=True).start()
+
+    started = time.monotonic()
+    start()
+    try:
+        try:
+            return finished.get(timeout=hedge_after)[1]
+        except queue.Empty:
+            pass
+
+        stats.count('hedges')
+        start()
+        remaining = None
+        if timeout is not None:
+            remaining = max(0, timeout - (time.monotonic() - started))
+        try:
+            p, cp = finished.get(timeout=remaining)
+        except queue.Empty:
+            return None
+        if p is procs[1]:
+            stats.count('hedge_wins')
+        return cp
+    finally:
+        for p in procs:
+            if p.poll() is None:
+                p.kill()
+
+
+class Stats(object):
+    """Collects timings and counters of a run.
+
+    Phases record their number of calls, wall time and CPU time; they
+    may nest. CPU time is process-wide, so phases running in several
+    threads at once are charged each other's CPU time. Counters are
+    plain sums and latencies are lists of durations, summarized by
+    their `percentiles` in `report`. Gauges keep the last, lowest and
+    highest value they were set to.
+    """
+    percentiles = [50, 95, 99]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self.lock:
+            self.start = (time.perf_counter(), time.process_time())
+            self.phases = defaultdict(lambda: {'calls': 0, 'wall': 0.0,
+                                               'cpu': 0.0})
+            self.counters = defaultdict(int)
+            self.latencies = defaultdict(list)
+            self.gauges = {}
+
+
+    @contextmanager
+    def phase(self, name):
+        """Time the block as phase `name`."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            with self.lock:
+                p = self.phases[name]
+                p['calls'] += 1
+                p['wall'] += wall
+                p['cpu'] += cpu
+
+
+    def timed(self, name):
+        """Decorator that times each call of a function as phase `name`."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+
+    def observe(self, name, seconds):
+        """Record a `seconds` long latency sample of `name`."""
+        with self.lock:
+            self.latencies[name].append(seconds)
+
+
+    def gauge(self, name, value):
+        """Set gauge `name` to `value`."""
+        with self.lock:
+            g = self.gauges.get(name)
+            if g is None:
+                self.gauges[name] = {'last': value, 'min': value,
+                                     'max': value}
+            else:
+                g['last'] = value
+                g['min'] = min(g['min'], value)
+                g['max'] = max(g['max'], value)
+
+
+    def summarize(self, samples):
+        samples = sorted(samples)
+        summary = {'count': len(samples)}
+        if samples:
+            summary['mean'] = sum(samples) / len(samples)
+            summary['max'] = samples[-1]
+            for pc in self.percentiles:
+                # nearest rank.
+                rank = max(1, -(-pc * len(samples) // 100))
+                summary['p{}'.format(pc)] = samples[rank - 1]
+
+        return summary
+
+
+    def report(self):
+        """Return the collected statistics as a dict."""
+        with self.lock:
+            return {
+                'version': __version__,
+                'wall': time.perf_counter() - self.start[0],
+                'cpu': time.process_time() - self.start[1],
+                'phases': {k: dict(v) for k, v in self.phases.items()},
+                'counters': dict(self.counters),
+                'latencies': {k: self.summarize(v)
+                              for k, v in self.latencies.items()},
+                'gauges': {k: dict(v) for k, v in self.gauges.items()},
+            }
+
+
+    def dump(self, fpath):
+        """Write `report` to `fpath` as JSON."""
+        write_file(fpath, json.dumps(self.report(), indent=2,
+                                     sort_keys=True) + '\n')
+
+
+# statistics of this run; see `Stats`.
+stats = Stats()
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter.
+
+    Allows `rate` acquisitions per second on average and bursts of up
+    to `burst` acquisitions.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        import asyncio
+
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
 def read_packages(pkgs_file):
     """Return list contaning of package names from `pkgs_file`.
 
@@ -101,32 +385,199 @@ def read_packages(pkgs_file):
     return list(pkgs_iter)
 
 
+def pkg_shard(pkg, shards):
+    """Return the shard, from 1 to `shards`, that `pkg` belongs to.
+
+    Packages are partitioned by a hash of their name, so a package is
+    in the same shard on every node and in every run.
+    """
+    return int(hashlib.sha1(pkg.encode()).hexdigest(), 16) % shards + 1
+
+
+def shard_packages(pkgs, shard, shards):
+    """Return packages in `pkgs` that belong to shard `shard` of `shards`.
+    """
+    return [pkg for pkg in pkgs if pkg_shard(pkg, shards) == shard]
+
+
+def http_session():
+    """Return the `requests.Session` shared by all HTTP requests.
+
+    The session is created on first call. It keeps up to
+    `http_pool_size` connections alive per host and retries failed
+    requests up to `http_retries` times with exponential backoff.
+    """
+    global _http_session
+
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(total=http_retries, backoff_factor=0.5,
+                          status_forcelist=[500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=http_pool_size,
+                                  pool_maxsize=http_pool_size,
+                                  max_retries=retry)
+
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+
+    return _http_session
+
+
+def http_get(url, **kwargs):
+    """GET `url` using the shared session.
+
+    `kwargs` are passed to `requests.Session.get`; the timeout defaults
+    to `http_timeout`. Returns an instance of `requests.Response`.
+    """
+    kwargs.setdefault('timeout', http_timeout)
+
+    return http_session().get(url, **kwargs)
+
+
+def http_cache_dir():
+    """Return the HTTP cache directory.
+
+    As a side effect, the directory is created if it does not exist.
+    """
+    hd = os.path.join(config_dir(), 'http-cache')
+    if not os.path.isdir(hd):
+        os.mkdir(hd)
+
+    return hd
+
+
+def http_get_cached(url):
+    """GET `url`, revalidating the copy of it cached on disk.
+
+    The ETag and Last-Modified validators of the cached copy are sent
+    along with the request and the cache is updated on a 200 response.
+
+    Returns tuple (res, text, modified). `text` is the body of `url`;
+    it is read from the cache when the server responds with 304 Not
+    Modified, in which case `modified` is False.
+    """
+    cache_file = path.join(http_cache_dir(),
+                           hashlib.sha1(url.encode()).hexdigest())
+
+    cached = None
+    headers = {}
+    if path.isfile(cache_file):
+        cached = json.loads(read_file(cache_file))
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    res = http_get(url, headers=headers)
+
+    if res.status_code == 304 and cached:
+        return res, cached['text'], False
+
+    if res.status_code == 200 and ('ETag' in res.headers or
+                                   'Last-Modified' in res.headers):
+        write_file(cache_file, json.dumps({
+            'url': url,
+            'etag': res.headers.get('ETag'),
+            'last_modified': res.headers.get('Last-Modified'),
+            'text': res.text,
+        }))
+
+    return res, res.text, True
+
+
+@stats.timed('get_packages')
 def get_packages(release):
     """Return newline separated list of packages for `release`.
 
     List of packages is slurped from
         http://bzr.savannah.gnu.org/lh/gnewsense/packages-`release`
+
+    If the list did not change since it was last slurped, the
+    previously written `pkgs` file for `release` is returned as is.
     """
-    url = 'http://bzr.savannah.gnu.org/lh/gnewsense/packages-{}/'
-    req = url.format(release)
+    import requests
+
+    req = pkgs_list_url_fmt.format(release)
 
     try:
-        res = requests.get(req)
-    except ConnectionError as ce:
-        print('ERROR: Problem GETting {} \n{}'.format(req, ce))
+        res, text, modified = http_get_cached(req)
+    except requests.RequestException as e:
+        print('ERROR: Problem GETting {} \n{}'.format(req, e))
         sys.exit(1)
 
-    if res.status_code != 200:
+    if res.status_code not in [200, 304]:
         print('{}: Error GETting {}'.format(res.status_code, req))
         sys.exit(1)
 
-    html_forest = BeautifulSoup(res.text, 'html.parser')
+    stats.count('http_cache_misses' if modified else 'http_cache_hits')
+    stats.count('bytes_fetched', len(res.content))
 
-    pkgs = '' # newline separated list of pkgs.
-    for td in html_forest.find_all('td', class_='autcell'):
-        pkgs += td.a.string.strip() + '\n'
+    pkgs_file = os.path.join(pkgs_dir(), release)
+    if not modified and path.isfile(pkgs_file):
+        return read_file(pkgs_file)
 
-    return pkgs
+    # newline separated list of pkgs.
+    return ''.join([pkg + '\n' for pkg in iter_packages(text)])
+
+
+class PkgsListParser(HTMLParser):
+    """Collects package names from a loggerhead package listing.
+
+    The name of a package is the text of the first link in a
+    `td.autcell` cell. Names are appended to `pkgs` as they are parsed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pkgs = []
+        self.in_cell = False
+        self.name = None
+
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'td':
+            classes = (dict(attrs).get('class') or '').split()
+            self.in_cell = 'autcell' in classes
+        elif tag == 'a' and self.in_cell:
+            self.name = []
+
+
+    def handle_data(self, data):
+        if self.name is not None:
+            self.name.append(data)
+
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.name is not None:
+            self.pkgs.append(''.join(self.name).strip())
+            self.name = None
+            self.in_cell = False
+        elif tag == 'td':
+            self.in_cell = False
+
+
+def iter_packages(html, chunk_size=65536):
+    """Yield package names from the loggerhead package listing `html`.
+
+    `html` is fed to a `PkgsListParser` `chunk_size` characters at a
+    time and names are yielded as soon as they are parsed.
+    """
+    parser = PkgsListParser()
+
+    for i in range(0, len(html), chunk_size):
+        parser.feed(html[i:i + chunk_size])
+        yield from parser.pkgs
+        parser.pkgs.clear()
+
+    parser.close()
+    yield from parser.pkgs
 
 
 def config_dir():
@@ -201,6 +652,16 @@ def readmes_dir(release):
     return rd_release
 
 
+def mirror_dir(release):
+    """Return absolute path of the local mirror of `release`'s branches.
+
+    The directory is a bzr shared repository created by
+    `mirror_release`; it may not exist yet.
+    """
+    return os.path.abspath(os.path.join(config_dir(), 'mirror',
+                                        'packages-{}'.format(release)))
+
+
 def wiki_page_dir(release):
     """Get wiki page directory for `release`.
     """
@@ -216,304 +677,2888 @@ def wiki_page_dir(release):
     return wd_release
 
 
-def wiki_page_path(release):
-    """Returns the path to file that contains wiki page for `release`.
+# directories used during a run; see `resolve_paths`.
+RunPaths = namedtuple('RunPaths', ['release', 'config_dir', 'pkgs_dir',
+                                   'readmes_dir', 'wiki_page_dir'])
 
-    """
-    wd_release = wiki_page_dir(release)
-    return os.path.join(wd_release, 'wiki.page')
 
+def resolve_paths(release):
+    """Return `RunPaths` for a run on `release`.
 
-def configured_p():
-    """Returns True if gns-deb-diff is configured; False otherwise.
+    As a side effect, the directories are created if they do not exist.
+    Resolve them once per run and pass them along instead of calling
+    `readmes_dir` and friends for each package.
     """
-    if os.path.isfile(config_file()):
-        return True
-    else:
-        return False
+    return RunPaths(release, config_dir(), pkgs_dir(), readmes_dir(release),
+                    wiki_page_dir(release))
 
 
-def configure():
-    """Configure gns-deb-diff.
+def journal_path(release):
+    """Return path of the checkpoint journal of a run on `release`.
+
+    As a side effect, the journal directory is created if it does not
+    exist.
     """
-    # prompt username and password.
-    config = {}
-    config['user'] = input('gNewSense wiki username: ')
-    config['pass'] = input('gNewSense wiki password: ')
+    jd = os.path.join(config_dir(), 'journal')
+    if not os.path.isdir(jd):
+        os.mkdir(jd)
 
-    json.dump(config, open(config_file(), 'w'))
-    os.chmod(config_file(), mode=0o600)
+    return os.path.join(jd, release)
 
 
-def save_gns_readme(content, release, pkg):
-    """Save README.gNewsense locally.
+def shards_dir(release):
+    """Return directory where shard artifacts of `release` are written.
 
-    :param str content:
-        Content of the README.gNewsense file.
-    :param str release:
-        Release name.
-    :param str pkg:
-        Package name.
+    As a side effect, the directory is created if it does not exist.
     """
-    # create gns_readme dir. for pkg.
-    gns_readme_dir = path.join(readmes_dir(release), pkg, 'debian')
+    sd = os.path.join(config_dir(), 'shards', release)
+    os.makedirs(sd, exist_ok=True)
 
-    try:
-        os.makedirs(gns_readme_dir, exist_ok=True)
-    except Exception as e:
-        print("Error creating directory '%s'\n Error Info:\n %r" %
-              (gns_readme_dir, e), file=sys.stderr)
-        sys.exit(1)
+    return sd
 
-    gns_readme = path.join(gns_readme_dir, 'README.gNewSense')
-    write_file(gns_readme, content)
-    print('Saved {}'.format(gns_readme))
 
+def shard_path(release, shard, shards):
+    """Return path of the artifact of shard `shard` of `shards`."""
+    return os.path.join(shards_dir(release),
+                        '{}-of-{}.json'.format(shard, shards))
 
-def slurp_gns_readme(release, pkg):
-    """Read and save the README.gNewSense for `pkg` in `release`.
 
-    """
-    readme_url = readme_url_fmt.format(release, pkg)
-    cmd = 'bzr cat {}'.format(readme_url)
-    cp = execute(cmd, out=PIPE, err=PIPE)
+class Journal(object):
+    """Checkpoint journal of a run, kept at `jpath`.
 
-    if(cp.returncode == 0):
-        save_gns_readme(cp.stdout.decode(), release, pkg)
-        return True
-    else:
-        print("README.gNewSense not found for package {}".format(pkg),
-              file=sys.stderr)
-        return False
+    It records the package list file used by the run and, for each
+    package, whether its README was found and saved. Each record is
+    one line, written as soon as the package is done; a line cut short
+    by a crash is ignored on load. If `resume` is True, the records of
+    an earlier run at `jpath` are loaded and appended to; otherwise the
+    journal is started afresh.
+    """
 
+    def __init__(self, jpath, resume=False):
+        self.path = jpath
+        self.pkgs_file = None
+        self.done = {}
+        self.lock = threading.Lock()
 
-def slurp_all_gns_readmes(release, pkgs):
-    """Read and save all README.gNewSense for `pkgs` in `release`.
+        torn = False
+        if resume and os.path.isfile(jpath):
+            torn = self.load()
 
-    Returns list of packages in `pkgs` that does not have README.gNewSense.
-    """
-    pkgs_noreadmes = []
-    for pkg in pkgs:
-        slurped = slurp_gns_readme(release, pkg)
+        self.f = open(jpath, 'a' if resume else 'w')
+        if torn:
+            self.f.write('\n')
+            self.f.flush()
 
-        if(not slurped):
-            pkgs_noreadmes.append(pkg)
 
-    return pkgs_noreadmes
+    def load(self):
+        """Load records; return True if the last line was cut short."""
+        with open(self.path) as f:
+            lines = f.read().split('\n')
 
+        # the last element is empty unless the last line was cut short.
+        for line in lines[:-1]:
+            status, _, arg = line.partition(' ')
+            if status == 'listed':
+                self.pkgs_file = arg
+            elif status in ['readme', 'none']:
+                self.done[arg] = status == 'readme'
 
-def read_gns_readme(release, pkg):
-    """Returns content of README.gNewSense for `pkg`.
+        return lines[-1] != ''
 
-    If `README.gNewSense` does not exists for `pkg`, None is returned.
 
-    """
-    readme_path = path.join(readmes_dir(release), pkg, 'debian',
-                            'README.gNewSense')
+    def write(self, status, arg):
+        with self.lock:
+            self.f.write('{} {}\n'.format(status, arg))
+            self.f.flush()
 
-    if not path.isfile(readme_path):
-        return None
 
-    readme_content = read_file(readme_path)
-    return readme_content
+    def record_listed(self, pkgs_file):
+        """Record that the package list was written to `pkgs_file`."""
+        self.pkgs_file = pkgs_file
+        self.write('listed', pkgs_file)
 
 
-def slurp_fields_from_readme(content):
-    """Returns dict containing fields slurped from `content`.
+    def record(self, pkg, found):
+        """Record that `pkg` is done; `found` tells if it has a README."""
+        self.write('readme' if found else 'none', pkg)
 
-    - If a field is not defined or if its value is empty in the
-    `content`, then its corresponding value in the dict will be None.
 
-    """
-    field_values = {}
-    for field in field_list:
-        pattern = r'{}:[ ]*(.+)'.format(field)
-        field_pattern = re.compile(pattern)
-        field_match = field_pattern.search(content)
-
-        if (field_match and
-            field_match.group(1) and
-            field_match.group(1).strip()):
-            field_values[field] = field_match.group(1).strip()
-        else:
-            field_values[field] = None
+    def resumed(self, release, pkgs, store):
+        """Return dict mapping each done package in `pkgs` to its README.
 
-    return field_values
+        READMEs are read from `store`; the README is None for packages
+        without one. Packages whose saved README is gone are left out
+        so that they are fetched again.
+        """
+        resumed = {}
+        for pkg in pkgs:
+            found = self.done.get(pkg)
+            if found is None:
+                continue
 
+            content = store.read(release, pkg) if found else None
+            if found and content is None:
+                continue
+            resumed[pkg] = content
 
-def get_wiki_page_data(release):
-    """Returns data needed to generate the gNewSense Debian Diff table.
+        return resumed
 
-    """
-    # get packages for release.
-    pkgs_file = mk_pkgs_list(release)
-    pkgs = read_packages(pkgs_file)
 
-    # get readmes for release.
-    pkgs_noreadmes = slurp_all_gns_readmes(release, pkgs)
+    def close(self):
+        self.f.close()
 
-    # go through each pkg's readme and slurp the fields.
-    table_data = {}
-    for pkg in pkgs:
-        readme_content = read_gns_readme(release, pkg)
-        if readme_content:
-            table_data[pkg] = slurp_fields_from_readme(readme_content)
 
-    return pkgs_noreadmes, table_data
+    def remove(self):
+        """Close and remove the journal; the run is complete."""
+        self.close()
+        os.remove(self.path)
 
 
-def construct_table_row(release, pkg, change, reason):
-    """Return a table row in moinmoin wiki markup.
+def negative_cache_path(release):
+    """Return path of the negative cache of `release`.
 
+    As a side effect, the cache directory is created if it does not
+    exist.
     """
-    if change is None:
-        change = ' '
-    if reason is None:
-        reason = ' '
+    nd = os.path.join(config_dir(), 'negative-cache')
+    if not os.path.isdir(nd):
+        os.mkdir(nd)
 
-    more_info_link = readme_link_fmt.format(release, pkg)
+    return os.path.join(nd, release + '.json')
 
-    return '||{}||{}||{}||[[{}|more_info]]||'.format(pkg, change, reason,
-                                                   more_info_link)
 
+class NegativeCache(object):
+    """Persistent cache of packages known to lack a README.gNewSense.
 
-def generate_wiki_table(release):
-    """Generate and return the gNewSense Debian Diff table as a string.
+    Each entry records when a package was found to lack a README and
+    the revision id of its branch at that time. An entry is trusted for
+    `ttl` seconds. If `check_revid` is True it is also dropped as soon
+    as the branch revision changes. The cache is kept as JSON at
+    `cpath` and written back by `save`.
     """
-    pkgs_noreadmes, table_data = get_wiki_page_data(release)
-
-    wiki_table = ''
-    for pkg, fields in table_data.items():
-        change = fields['Change-Type']
-        reason = fields['Changed-From-Debian']
-        wiki_table += construct_table_row(release, pkg, change, reason) + '\n'
 
-    return pkgs_noreadmes, wiki_table
+    def __init__(self, cpath, ttl, check_revid=False):
+        self.path = cpath
+        self.ttl = ttl
+        self.check_revid = check_revid
+        self.lock = threading.Lock()
 
+        try:
+            with open(cpath) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
 
-def gns_wiki_header():
-    """Return gNewSense wiki header."""
-    header = resource_string(__name__, 'gns_deb_diff/data/wiki-header.txt')
-    return header.decode()
 
+    def absent(self, pkg, revid=None):
+        """Return True if `pkg`, at `revid`, is known to lack a README."""
+        entry = self.entries.get(pkg)
+        if entry is None or time.time() - entry['time'] > self.ttl:
+            return False
+        if self.check_revid and (revid is None or revid != entry['revid']):
+            return False
 
-def generate_wiki_page(release):
-    """Generate and return the gNewSense Debian Diff wiki page.
-    """
-    pkgs_noreadmes, wiki_table = generate_wiki_table(release)
-    wiki_page = gns_wiki_header() + '\n' + wiki_table
+        return True
 
-    return pkgs_noreadmes, wiki_page
 
+    def update(self, pkg, found, revid=None):
+        """Record whether README of `pkg`, at `revid`, was `found`."""
+        with self.lock:
+            if found:
+                self.entries.pop(pkg, None)
+            else:
+                self.entries[pkg] = {'time': time.time(), 'revid': revid}
 
-def read_wiki_page(release):
-    """Read wiki page for `release` from disk.
-    """
-    wp_file = wiki_page_path(release)
 
-    if not path.isfile(wp_file):
-        return None
+    def save(self):
+        """Write unexpired entries to the cache file."""
+        now = time.time()
+        with self.lock:
+            entries = {pkg: e for pkg, e in self.entries.items()
+                       if now - e['time'] <= self.ttl}
 
-    return read_file(wp_file)
+        tmp = self.path + '.tmp'
+        write_file(tmp, json.dumps(entries))
+        os.replace(tmp, self.path)
 
 
-def write_wiki_page(release, content):
-    """Write wiki page `content` to `release`' last.rev file.
+def wiki_page_path(release):
+    """Returns the path to file that contains wiki page for `release`.
 
     """
-    wp_file = wiki_page_path(release)
-    write_file(wp_file, content)
+    wd_release = wiki_page_dir(release)
+    return os.path.join(wd_release, 'wiki.page')
 
 
-def get_wiki_mc(url, user, passwd): # pragma: no cover
-    """Return instance of `xmlprc.client.MultiCall` object.
+def wiki_fingerprint_path(release):
+    """Return path to the input fingerprint of `release`' wiki page.
 
+    It is kept next to the wiki page; see `input_fingerprint`.
     """
-    url = urljoin(url, '?action=xmlrpc2')
-    conn = ServerProxy(url, allow_none=True)
-
-    try:
-        token = conn.getAuthToken(user, passwd)
-    except Fault as f:
-        print(f.faultString)
-        exit(1)
-    except ProtocolError as p:
-        print('Protocal Error: {} {}'.format(p.errcode, p.errmsg))
-        exit(1)
+    return os.path.join(wiki_page_dir(release), 'wiki.fingerprint')
 
-    mc = MultiCall(conn)
-    mc.applyAuthToken(token)
-
-    return mc
 
+def configured_p():
+    """Returns True if gns-deb-diff is configured; False otherwise.
+    """
+    if os.path.isfile(config_file()):
+        return True
+    else:
+        return False
 
-def push_wiki_page(url, user, passwd, version, content):
-    """Push `release`' wiki page to wiki at `uri`.
 
+def configure():
+    """Configure gns-deb-diff.
     """
-    def process_result(r, f=None):
-        if(r == 'SUCCESS'):
-            print('auth success.')
-        elif(r == True):
-            print('wiki page updated.')
-        elif(f and f.faultCode == 'INVALID'):
-            print('auth failure')
-        elif(f and f.faultCode == 1):
-            print('wiki page not updated.')
+    # prompt username and password.
+    config = {}
+    config['user'] = input('gNewSense wiki username: ')
+    config['pass'] = input('gNewSense wiki password: ')
 
+    json.dump(config, open(config_file(), 'w'))
+    os.chmod(config_file(), mode=0o600)
 
-    page = '/'.join(['Documentation', str(version), 'DifferencesWithDebian'])
-    mc = get_wiki_mc(url, user, passwd)
-    mc.putPage(page, content)
 
-    results = mc()
-    try:
-        for r in results:
-            process_result(r)
-    except Fault as f:
-        process_result(None, f)
+class TreeStore(object):
+    """Stores READMEs in a directory tree.
 
+    The README.gNewSense of `pkg` in `release` is kept at
+    `readmes/release/pkg/debian/README.gNewSense` under the config
+    directory and its revision id at `readmes/release/pkg/revision-id`.
+    A revision id without a README records that the package had no
+    README at that revision.
 
-def make_push(args):
-    """make wiki page and push it.
+    The readmes directory of a release is resolved and created once per
+    store; if `paths`, a `RunPaths` or a list of them, is given, their
+    readmes directories are used for their releases.
     """
-    release = args.release
-    version = args.version
+    name = 'tree'
 
-    # read previously generated wiki page for release
-    old_wiki_page = read_wiki_page(release)
+    def __init__(self, paths=None):
+        self.dirs = {}
+        if isinstance(paths, RunPaths):
+            paths = [paths]
+        for run_paths in paths or []:
+            self.dirs[run_paths.release] = run_paths.readmes_dir
 
-    # freshly generate wiki page
-    pkgs_noreadmes, wiki_page = generate_wiki_page(release)
 
-    if old_wiki_page == wiki_page:
-        print('no changes.')
-        return
+    def readmes_dir(self, release):
+        rd = self.dirs.get(release)
+        if rd is None:
+            rd = self.dirs[release] = readmes_dir(release)
 
-    # configure if needed.
-    if not configured_p():
-        configure()
+        return rd
 
-    # read configuration.
-    config = read_config_file()
 
-    write_wiki_page(release, wiki_page)
-    push_wiki_page(gns_wiki, config['user'], config['pass'], version, wiki_page)
+    def readme_path(self, release, pkg):
+        return path.join(self.readmes_dir(release), pkg, 'debian',
+                         'README.gNewSense')
 
-    return config, pkgs_noreadmes, old_wiki_page, wiki_page
 
+    def revid_path(self, release, pkg):
+        return path.join(self.readmes_dir(release), pkg, 'revision-id')
 
-def get_args():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--version', action='version', version=__version__)
-    parser.add_argument('release', help='gNewSense release name')
-    parser.add_argument('version', help='gNewSense version number',
-                        type=int)
 
-    return parser.parse_args()
+    def prepare(self, release):
+        self.readmes_dir(release)
+
+
+    def location(self, release, pkg):
+        return self.readme_path(release, pkg)
+
+
+    def read(self, release, pkg):
+        try:
+            f = open(self.readme_path(release, pkg), 'r')
+        except FileNotFoundError:
+            return None
+
+        with f:
+            return f.read()
+
+
+    def save(self, release, pkg, content):
+        # create gns_readme dir. for pkg.
+        gns_readme_dir = path.dirname(self.readme_path(release, pkg))
+
+        try:
+            os.makedirs(gns_readme_dir, exist_ok=True)
+        except Exception as e:
+            print("Error creating directory '%s'\n Error Info:\n %r" %
+                  (gns_readme_dir, e), file=sys.stderr)
+            sys.exit(1)
+
+        write_file(self.readme_path(release, pkg), content)
+
+
+    def read_revid(self, release, pkg):
+        try:
+            f = open(self.revid_path(release, pkg), 'r')
+        except FileNotFoundError:
+            return None
+
+        with f:
+            return f.read().strip()
+
+
+    def save_revid(self, release, pkg, revid):
+        write_file(self.revid_path(release, pkg), revid + '\n')
+
+
+    def save_absent(self, release, pkg, revid):
+        readme = self.readme_path(release, pkg)
+        if path.isfile(readme):
+            os.remove(readme)
+
+        os.makedirs(path.dirname(self.revid_path(release, pkg)),
+                    exist_ok=True)
+        self.save_revid(release, pkg, revid)
+
+
+    def remove(self, release, pkg):
+        for p in [self.readme_path(release, pkg),
+                  self.revid_path(release, pkg)]:
+            if path.isfile(p):
+                os.remove(p)
+
+
+    def releases(self):
+        rd = path.join(config_dir(), 'readmes')
+        if not path.isdir(rd):
+            return []
+
+        return sorted([r for r in os.listdir(rd)
+                       if path.isdir(path.join(rd, r))])
+
+
+    def pkgs(self, release):
+        return sorted([pkg for pkg in os.listdir(self.readmes_dir(release))
+                       if path.isfile(self.readme_path(release, pkg))])
+
+
+    def close(self):
+        pass
+
+
+class SqliteStore(object):
+    """Stores READMEs in the SQLite database `db_path`.
+
+    READMEs and their revision ids are kept in a single table keyed by
+    (release, pkg); a row without content records that the package had
+    no README at its revision. A store may be shared between threads.
+    """
+    name = 'sqlite'
+
+    def __init__(self, db_path):
+        import sqlite3
+
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS readmes ('
+                          ' release TEXT NOT NULL,'
+                          ' pkg TEXT NOT NULL,'
+                          ' content TEXT,'
+                          ' revid TEXT,'
+                          ' PRIMARY KEY (release, pkg))')
+        self.conn.commit()
+
+
+    def query(self, sql, *params):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+
+    def update(self, sql, *params):
+        with self.lock:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+
+    def prepare(self, release):
+        pass
+
+
+    def location(self, release, pkg):
+        return '{}:{}/{}'.format(self.db_path, release, pkg)
+
+
+    def read(self, release, pkg):
+        rows = self.query('SELECT content FROM readmes'
+                          ' WHERE release = ? AND pkg = ?', release, pkg)
+        return rows[0][0] if rows else None
+
+
+    def save(self, release, pkg, content):
+        self.update('INSERT OR REPLACE INTO readmes (release, pkg, content)'
+                    ' VALUES (?, ?, ?)', release, pkg, content)
+
+
+    def read_revid(self, release, pkg):
+        rows = self.query('SELECT revid FROM readmes'
+                          ' WHERE release = ? AND pkg = ?', release, pkg)
+        return rows[0][0] if rows else None
+
+
+    def save_revid(self, release, pkg, revid):
+        self.update('UPDATE readmes SET revid = ?'
+                    ' WHERE release = ? AND pkg = ?', revid, release, pkg)
+
+
+    def save_absent(self, release, pkg, revid):
+        self.update('INSERT OR REPLACE INTO readmes (release, pkg, revid)'
+                    ' VALUES (?, ?, ?)', release, pkg, revid)
+
+
+    def remove(self, release, pkg):
+        self.update('DELETE FROM readmes WHERE release = ? AND pkg = ?',
+                    release, pkg)
+
+
+    def releases(self):
+        return [r for r, in self.query('SELECT DISTINCT release'
+                                       ' FROM readmes ORDER BY release')]
+
+
+    def pkgs(self, release):
+        return [p for p, in self.query('SELECT pkg FROM readmes'
+                                       ' WHERE release = ? AND'
+                                       ' content IS NOT NULL ORDER BY pkg',
+                                       release)]
+
+
+    def close(self):
+        self.conn.close()
+
+
+def work_queue_path():
+    """Return default path of the `WorkQueue` database."""
+    return path.join(config_dir(), 'queue.db')
+
+
+class WorkQueue(object):
+    """Queue of packages to fetch, kept in the SQLite database `db_path`.
+
+    A coordinator fills the queue with a release's packages and
+    `gd-diff worker` processes, which may run on other hosts sharing
+    `db_path`, claim them. A claim is a lease of `lease` seconds; a
+    package whose lease ran out before its worker completed it is
+    handed to the next worker that asks. Results of completed packages
+    are kept in the queue for the coordinator. A filled release is
+    open until the coordinator marks it finished, which tells workers
+    to exit; see `release_state`.
+
+    The database is not in WAL mode, which needs shared memory, so that
+    it may be kept on NFS.
+    """
+
+    def __init__(self, db_path):
+        import sqlite3
+
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        # transactions are begun explicitly; see `claim`.
+        self.conn = sqlite3.connect(db_path, timeout=60,
+                                    isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS work ('
+                          ' release TEXT NOT NULL,'
+                          ' pkg TEXT NOT NULL,'
+                          ' idx INTEGER NOT NULL,'
+                          " state TEXT NOT NULL DEFAULT 'pending',"
+                          ' worker TEXT,'
+                          ' lease_until REAL,'
+                          ' attempts INTEGER NOT NULL DEFAULT 0,'
+                          ' fields TEXT,'
+                          ' PRIMARY KEY (release, pkg))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS releases ('
+                          ' release TEXT PRIMARY KEY,'
+                          ' state TEXT NOT NULL)')
+
+
+    def query(self, sql, *params):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+
+    def fill(self, release, pkgs):
+        """Queue `pkgs` of `release`, dropping earlier work on it.
+
+        The release is open from then on. Returns the number of packages
+        queued; a package given more than once is queued once.
+        """
+        with self.lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute('DELETE FROM work WHERE release = ?',
+                              (release,))
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO work (release, pkg, idx)'
+                ' VALUES (?, ?, ?)',
+                [(release, pkg, i) for i, pkg in enumerate(pkgs)])
+            self.conn.execute('INSERT OR REPLACE INTO releases'
+                              " (release, state) VALUES (?, 'open')",
+                              (release,))
+            queued = self.conn.execute(
+                'SELECT COUNT(*) FROM work WHERE release = ?',
+                (release,)).fetchone()[0]
+
+        return queued
+
+
+    def finish(self, release):
+        """Mark `release` finished; its workers exit."""
+        with self.lock:
+            self.conn.execute("UPDATE releases SET state = 'finished'"
+                              ' WHERE release = ?', (release,))
+
+
+    def release_state(self, release):
+        """Return 'open' or 'finished'; None if `release` is not queued.
+        """
+        rows = self.query('SELECT state FROM releases WHERE release = ?',
+                          release)
+
+        return rows[0][0] if rows else None
+
+
+    def claim(self, release, worker, lease):
+        """Lease a package of `release` to `worker` for `lease` seconds.
+
+        Returns the package; None if every package is either done or
+        leased to a worker whose lease has not run out.
+        """
+        now = time.time()
+        # BEGIN IMMEDIATE locks out other workers until the package is
+        # leased.
+        with self.lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            row = self.conn.execute(
+                'SELECT pkg FROM work WHERE release = ? AND'
+                " (state = 'pending' OR"
+                "  (state = 'leased' AND lease_until < ?))"
+                ' ORDER BY idx LIMIT 1', (release, now)).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE work SET state = 'leased', worker = ?,"
+                    ' lease_until = ?, attempts = attempts + 1'
+                    ' WHERE release = ? AND pkg = ?',
+                    (worker, now + lease, release, row[0]))
+
+        return row[0] if row else None
+
+
+    def complete(self, release, pkg, worker, fields):
+        """Record `fields` of `pkg`, leased to `worker`.
+
+        `fields` is None if `pkg` has no README. Returns False, and the
+        result is dropped, if the lease was handed to another worker.
+        """
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE work SET state = 'done', fields = ?,"
+                ' lease_until = NULL'
+                " WHERE release = ? AND pkg = ? AND state = 'leased'"
+                ' AND worker = ?',
+                (json.dumps(fields), release, pkg, worker))
+
+        return cur.rowcount == 1
+
+
+    def progress(self, release):
+        """Return dict mapping each state to its number of packages."""
+        counts = dict.fromkeys(['pending', 'leased', 'done'], 0)
+        counts.update(self.query('SELECT state, COUNT(*) FROM work'
+                                 ' WHERE release = ? GROUP BY state',
+                                 release))
+
+        return counts
+
+
+    def results(self, release):
+        """Return results of `release` as `iter_wiki_page_data` does.
+
+        All packages of `release` must be done.
+        """
+        pkgs_noreadmes = []
+        table_data = []
+        for pkg, fields in self.query('SELECT pkg, fields FROM work'
+                                      ' WHERE release = ? ORDER BY idx',
+                                      release):
+            fields = json.loads(fields)
+            if fields is None:
+                pkgs_noreadmes.append(pkg)
+            else:
+                table_data.append((pkg, fields))
+
+        return pkgs_noreadmes, table_data
+
+
+    def close(self):
+        self.conn.close()
+
+
+def open_readme_store(name='tree', paths=None):
+    """Return README store `name`; either 'tree' or 'sqlite'.
+
+    The 'sqlite' store is kept at `readmes.db` in the config directory.
+    `paths`, if given, is the `RunPaths` of the current run, or a list
+    of them, one per release, for a run on several releases.
+    """
+    if name == SqliteStore.name:
+        if isinstance(paths, RunPaths):
+            paths = [paths]
+        cd = paths[0].config_dir if paths else config_dir()
+        return SqliteStore(path.join(cd, 'readmes.db'))
+
+    return TreeStore(paths)
+
+
+def migrate_readmes(src, dst, releases=None):
+    """Copy READMEs and their revision ids from store `src` to `dst`.
+
+    All releases in `src` are copied unless `releases` is given.
+    Returns the number of READMEs copied.
+    """
+    if releases is None:
+        releases = src.releases()
+
+    copied = 0
+    for release in releases:
+        for pkg in src.pkgs(release):
+            dst.save(release, pkg, src.read(release, pkg))
+
+            revid = src.read_revid(release, pkg)
+            if revid:
+                dst.save_revid(release, pkg, revid)
+
+            copied += 1
+
+    return copied
+
+
+def save_gns_readme(content, release, pkg, store=None):
+    """Save README.gNewsense locally.
+
+    :param str content:
+        Content of the README.gNewsense file.
+    :param str release:
+        Release name.
+    :param str pkg:
+        Package name.
+    :param store:
+        README store; defaults to `TreeStore`.
+    """
+    store = store or TreeStore()
+
+    store.save(release, pkg, content)
+    print('Saved {}'.format(store.location(release, pkg)))
+
+
+def read_gns_revid(release, pkg, store=None):
+    """Return recorded revision id of `pkg`'s README.gNewSense.
+
+    None is returned if no revision id was recorded.
+    """
+    return (store or TreeStore()).read_revid(release, pkg)
+
+
+def save_gns_revid(revid, release, pkg, store=None):
+    """Record `revid` as the revision id of `pkg`'s README.gNewSense.
+
+    """
+    (store or TreeStore()).save_revid(release, pkg, revid)
+
+
+def save_gns_absent(revid, release, pkg, store=None):
+    """Record that `pkg` has no README.gNewSense at revision `revid`.
+
+    A previously saved README is removed.
+    """
+    (store or TreeStore()).save_absent(release, pkg, revid)
+
+
+def remove_gns_readme(release, pkg, store=None):
+    """Remove `pkg`'s README.gNewSense and its recorded revision id.
+
+    """
+    (store or TreeStore()).remove(release, pkg)
+
+
+def branch_url(release, pkg, mirror=None):
+    """Return URL of `pkg`'s branch in `release`.
+
+    If `mirror` is given, it is the `mirror_dir` of `release` and the
+    branch is read from there instead of from Savannah.
+    """
+    if mirror:
+        return 'file://' + os.path.join(mirror, pkg)
+
+    return branch_url_fmt.format(release, pkg)
+
+
+def readme_url(release, pkg, mirror=None):
+    """Return URL of `pkg`'s README.gNewSense; see `branch_url`."""
+    return branch_url(release, pkg, mirror) + '/debian/README.gNewSense'
+
+
+class FetchPolicy(object):
+    """Timeouts, retries and hedging of the commands of a fetch.
+
+    A command running longer than `timeout` seconds is killed and run
+    again, up to `retries` times, after waiting `fetch_backoff` seconds,
+    doubled on each retry. If `hedge` is True, a duplicate of a command
+    is started once it runs longer than the p95 of the commands run so
+    far; see `execute_hedged`. A policy may be shared between threads.
+    """
+
+    def __init__(self, timeout=None, retries=0, hedge=False):
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.lock = threading.Lock()
+        # latencies of the last `hedge_window` commands.
+        self.latencies = deque(maxlen=hedge_window)
+        self.observed = 0
+        self.hedge_delay = None
+
+
+    def observe(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.observed += 1
+            # the p95 is recomputed every `hedge_min_samples` commands.
+            if (len(self.latencies) >= hedge_min_samples and
+                self.observed % hedge_min_samples == 0):
+                self.hedge_delay = stats.summarize(self.latencies)['p95']
+
+
+    def execute(self, cmd):
+        """Run `cmd` with the policy; return `subprocess.CompletedProcess`.
+
+        If every attempt timed out, the returned process has a non-zero
+        return code.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.count('fetch_retries')
+                time.sleep(fetch_backoff * 2 ** (attempt - 1))
+
+            start = time.perf_counter()
+            cp = execute_hedged(cmd, self.timeout,
+                                self.hedge_delay if self.hedge else None)
+            if cp is not None:
+                self.observe(time.perf_counter() - start)
+                return cp
+
+            stats.count('fetch_timeouts')
+            note_fetch_error()
+            print("Error: '{}' timed out after {} seconds".format(
+                cmd, self.timeout), file=sys.stderr)
+
+        return CompletedProcess(shlex.split(cmd), -signal.SIGKILL, b'', b'')
+
+
+def note_fetch_request():
+    """Record a request to a branch, like a bzr command, of this thread.
+    """
+    _fetch_counts.requests = getattr(_fetch_counts, 'requests', 0) + 1
+
+
+def fetch_requests():
+    """Return the number of requests noted by this thread so far."""
+    return getattr(_fetch_counts, 'requests', 0)
+
+
+def note_fetch_error():
+    """Record an error, like a timeout, of this thread's fetch.
+
+    Backends note every failure other than the branch or file not
+    existing.
+    """
+    _fetch_counts.errors = getattr(_fetch_counts, 'errors', 0) + 1
+
+
+def fetch_errors():
+    """Return the number of errors noted by this thread so far."""
+    return getattr(_fetch_counts, 'errors', 0)
+
+
+def bzr_failed(cp):
+    """Return True if bzr's completed process `cp` is a fetch failure.
+
+    A bzr command that reports that the branch or file does not exist
+    has not failed.
+    """
+    return cp.returncode != 0 and not missing_error_re.search(
+        cp.stderr.decode(errors='replace'))
+
+
+class AdaptiveLimiter(object):
+    """AIMD limit on the number of fetches in flight.
+
+    The limit starts at 1 and stays between 1 and `maximum`. Fetches
+    report their latency and errors as they complete; fetches served
+    from a cache, which made no request, report no latency. On an
+    error, the limit is halved at once. Fetches that started before
+    the last decrease do not count, so errors of fetches in flight
+    together halve it once. Otherwise, after each
+    `adaptive_window` fetches, the limit is halved if their median
+    latency is above `latency_tolerance` times the lowest median of
+    the last `baseline_windows` windows, and raised by one if not. As
+    old windows drop out, the baseline follows lasting changes in
+    latency. Until the first decrease, the limit is doubled instead of
+    raised by one. It is kept in the 'concurrency_limit' gauge of
+    `stats`. A limiter is shared between threads.
+    """
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = 1
+        self.inflight = 0
+        self.slow_start = True
+        self.decreases = 0
+        self.medians = deque(maxlen=baseline_windows)
+        self.recent = []
+        self.cond = threading.Condition()
+        stats.gauge('concurrency_limit', self.limit)
+
+
+    def acquire(self):
+        """Take a slot; returns the epoch to pass to `release`."""
+        with self.cond:
+            while self.inflight >= self.limit:
+                self.cond.wait()
+            self.inflight += 1
+
+            return self.decreases
+
+
+    def release(self, latency, errors=0, epoch=None):
+        """Release a slot of a fetch that took `latency` seconds.
+
+        `latency` is None if the fetch made no request. If `epoch`, as
+        returned by `acquire`, is given and the limit was decreased
+        since, the fetch is not counted.
+        """
+        with self.cond:
+            self.inflight -= 1
+            stale = epoch is not None and epoch != self.decreases
+            if errors and not stale:
+                self.decrease()
+            elif latency is not None and not stale:
+                self.recent.append(latency)
+                if len(self.recent) >= adaptive_window:
+                    self.adjust()
+            self.cond.notify_all()
+
+
+    def adjust(self):
+        median = sorted(self.recent)[len(self.recent) // 2]
+        self.recent = []
+        self.medians.append(median)
+
+        if median > min(self.medians) * latency_tolerance:
+            self.decrease()
+        elif self.slow_start:
+            self.set_limit(self.limit * 2)
+        else:
+            self.set_limit(self.limit + 1)
+
+
+    def decrease(self):
+        self.slow_start = False
+        self.decreases += 1
+        # samples taken under the old limit do not count.
+        self.recent = []
+        self.set_limit(self.limit // 2)
+
+
+    def set_limit(self, limit):
+        self.limit = max(1, min(self.maximum, limit))
+        stats.gauge('concurrency_limit', self.limit)
+
+
+    def run(self, func, *args):
+        """Call `func(*args)` in a slot and report on it."""
+        epoch = self.acquire()
+        before = fetch_errors()
+        requests = fetch_requests()
+        start = time.perf_counter()
+        errors = 1
+        try:
+            result = func(*args)
+            errors = fetch_errors() - before
+            return result
+        finally:
+            latency = time.perf_counter() - start
+            if fetch_requests() == requests:
+                latency = None
+            self.release(latency, errors, epoch)
+
+
+class BzrBackend(object):
+    """Reads package branches by running a `bzr` command per request.
+
+    If `mirror` is given, branches are read from that `mirror_dir`;
+    this holds for all backends. Commands are run with `policy`, a
+    `FetchPolicy`, if given.
+    """
+    name = 'bzr'
+
+    def __init__(self, mirror=None, policy=None):
+        self.mirror = mirror
+        self.policy = policy
+
+
+    def bzr(self, args):
+        cmd = 'bzr {}'.format(args)
+        note_fetch_request()
+        if self.policy is None:
+            cp = execute(cmd, out=PIPE, err=PIPE)
+        else:
+            cp = self.policy.execute(cmd)
+
+        if bzr_failed(cp):
+            note_fetch_error()
+
+        return cp
+
+
+    def revision_id(self, release, pkg):
+        """Return revision id of `pkg`'s branch; None on failure."""
+        return parse_revision_info(self.bzr('revision-info -d {}'.format(
+            branch_url(release, pkg, self.mirror))))
+
+
+    def cat_readme(self, release, pkg):
+        """Return README.gNewSense of `pkg` as bytes; None if not found."""
+        return parse_cat(self.bzr('cat {}'.format(
+            readme_url(release, pkg, self.mirror))))
+
+
+    def close(self):
+        pass
+
+
+class BreezyBackend(object):
+    """Reads package branches in-process with the breezy Python API.
+
+    Each thread keeps one transport per remote host and reuses it for
+    all branches on that host. Raises ImportError if breezy is not
+    installed; bzrlib is not supported as it is Python 2 only.
+    """
+    name = 'breezy'
+
+    def __init__(self, mirror=None):
+        self.mirror = mirror
+        self.breezy = import_breezy()
+        self.missing_errors = (self.breezy.errors.NotBranchError,
+                               self.breezy.transport.NoSuchFile)
+        self.local = threading.local()
+        self.transports = []
+        self.lock = threading.Lock()
+
+
+    def open_branch(self, release, pkg):
+        note_fetch_request()
+        url = urlparse(branch_url(release, pkg, self.mirror))
+        base = '{}://{}/'.format(url.scheme, url.netloc)
+
+        if not hasattr(self.local, 'transports'):
+            self.local.transports = {}
+
+        t = self.local.transports.get(base)
+        if t is None:
+            t = self.breezy.transport.get_transport_from_url(base)
+            self.local.transports[base] = t
+            with self.lock:
+                self.transports.append(t)
+
+        return self.breezy.branch.Branch.open_from_transport(
+            t.clone(url.path.lstrip('/')))
+
+
+    def revision_id(self, release, pkg):
+        try:
+            return self.open_branch(release, pkg).last_revision().decode()
+        except self.missing_errors:
+            return None
+        except (self.breezy.errors.BzrError, OSError):
+            note_fetch_error()
+            return None
+
+
+    def cat_readme(self, release, pkg):
+        try:
+            tree = self.open_branch(release, pkg).basis_tree()
+            with tree.lock_read():
+                return tree.get_file_text('debian/README.gNewSense')
+        except self.missing_errors:
+            return None
+        except (self.breezy.errors.BzrError, OSError):
+            note_fetch_error()
+            return None
+
+
+    def close(self):
+        with self.lock:
+            for t in self.transports:
+                t.disconnect()
+            self.transports = []
+
+
+class HelperBackend(object):
+    """Reads package branches through a pool of long-lived helpers.
+
+    `workers` helper processes running `gns_deb_diff/bzr_helper.py`
+    under the `python` interpreter, which defaults to ours, are
+    started once and each request is sent to an idle one. `python`
+    must have breezy or bzrlib installed. Raises OSError if a helper
+    fails to start; once running, requests that no helper can answer
+    are read with `BzrBackend`.
+    """
+    name = 'helper'
+
+    def __init__(self, workers=1, python=None, mirror=None):
+        self.mirror = mirror
+        self.python = python or sys.executable
+        self.pool = queue.Queue()
+        self.procs = []
+        self.bzr = None
+
+        try:
+            for _ in range(workers):
+                self.pool.put(self.start())
+        except OSError:
+            self.close()
+            raise
+
+
+    def start(self):
+        """Start a helper and wait until it is ready; return it."""
+        p = Popen([self.python, bzr_helper_path()], stdin=PIPE,
+                  stdout=PIPE)
+        stats.count('subprocesses')
+        self.procs.append(p)
+
+        status = p.stdout.readline().decode().strip()
+        if status != 'ready':
+            self.stop(p)
+            raise OSError('bzr helper failed to start: {}'.format(
+                status or 'exit status {}'.format(p.returncode)))
+
+        return p
+
+
+    def exchange(self, p, request):
+        p.stdin.write(request)
+        p.stdin.flush()
+
+        status = p.stdout.readline().split()
+        if not status:
+            raise OSError('bzr helper {} exited'.format(p.pid))
+        if status[0] == b'missing':
+            return None
+        if status[0] == b'error':
+            note_fetch_error()
+            return None
+
+        return p.stdout.read(int(status[1]))
+
+
+    def request(self, *words):
+        """Send request `words` to an idle helper; return its answer.
+
+        A helper that died is replaced and the request sent again once.
+        If it cannot be replaced the pool shrinks by one helper. Raises
+        OSError if the request fails or no helper is left.
+        """
+        request = ' '.join(words).encode() + b'\n'
+        note_fetch_request()
+
+        p = self.pool.get()
+        if p is None:
+            self.pool.put(None)
+            raise OSError('no bzr helper is left')
+
+        try:
+            try:
+                return self.exchange(p, request)
+            except OSError:
+                self.stop(p)
+                p = None
+                p = self.start()
+                return self.exchange(p, request)
+        except OSError:
+            if p is not None:
+                self.stop(p)
+                p = None
+            raise
+        finally:
+            if p is not None:
+                self.pool.put(p)
+            elif not self.procs:
+                # wake up requests waiting for a helper.
+                self.pool.put(None)
+
+
+    def fallback(self, err):
+        """Return the `BzrBackend` that reads for failed helpers."""
+        if self.bzr is None:
+            print('{}; using bzr'.format(err), file=sys.stderr)
+            self.bzr = BzrBackend(self.mirror)
+
+        return self.bzr
+
+
+    def revision_id(self, release, pkg):
+        try:
+            revid = self.request('revision-info',
+                                 branch_url(release, pkg, self.mirror))
+        except OSError as err:
+            return self.fallback(err).revision_id(release, pkg)
+
+        return revid.decode() if revid is not None else None
+
+
+    def cat_readme(self, release, pkg):
+        try:
+            return self.request('cat', branch_url(release, pkg, self.mirror),
+                                'debian/README.gNewSense')
+        except OSError as err:
+            return self.fallback(err).cat_readme(release, pkg)
+
+
+    def stop(self, p):
+        """Stop helper `p`; it exits when its stdin is closed."""
+        self.procs.remove(p)
+        try:
+            p.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        try:
+            p.wait(timeout=5)
+        except TimeoutExpired:
+            p.kill()
+            p.wait()
+        p.stdout.close()
+
+
+    def close(self):
+        for p in list(self.procs):
+            self.stop(p)
+
+
+class LoggerheadBackend(object):
+    """Downloads READMEs over HTTP from Savannah's loggerhead.
+
+    All requests go through the pooled keep-alive `http_session`, so
+    concurrent jobs share its connections. A 404 means the package has
+    no README; other errors are noted with `note_fetch_error`.
+    Loggerhead has no cheap way to get a branch's revision id, so
+    `--incremental` fetches every README.
+    """
+    name = 'loggerhead'
+
+
+    def revision_id(self, release, pkg):
+        return None
+
+
+    def cat_readme(self, release, pkg):
+        import requests
+
+        url = readme_download_fmt.format(release, pkg)
+        note_fetch_request()
+        try:
+            res = http_get(url)
+        except requests.RequestException as e:
+            print('Error: Unable to GET {}: {}'.format(url, e),
+                  file=sys.stderr)
+            note_fetch_error()
+            return None
+
+        if res.status_code == 404:
+            return None
+        if res.status_code != 200:
+            print('Error: Unable to GET {}: {}'.format(url, res.status_code),
+                  file=sys.stderr)
+            note_fetch_error()
+            return None
+
+        return res.content
+
+
+    def close(self):
+        pass
+
+
+def bzr_helper_path():
+    """Return path to the bzr helper script."""
+    return path.join(path.dirname(path.abspath(gns_deb_diff.__file__)),
+                     'bzr_helper.py')
+
+
+def import_breezy():
+    """Import and initialize breezy once per process; return it.
+
+    Raises ImportError if breezy is not installed.
+    """
+    global _breezy
+
+    with _breezy_lock:
+        if _breezy is None:
+            import breezy
+            import breezy.branch
+            import breezy.errors
+            import breezy.plugin
+            import breezy.transport
+
+            breezy.initialize(setup_ui=False)
+            breezy.plugin.load_plugins()
+            _breezy = breezy
+
+    return _breezy
+
+
+def open_backend(name='auto', jobs=1, python=None, mirror=None,
+                 policy=None):
+    """Return README fetch backend `name`.
+
+    `name` is 'bzr', 'breezy', 'helper', 'loggerhead' or 'auto'. 'auto'
+    and 'breezy' use the in-process `BreezyBackend` if breezy is
+    importable and fall back to the `bzr` command otherwise. 'helper'
+    starts `jobs` `HelperBackend` helpers under `python` and falls back
+    to the `bzr` command if they fail to start. See `BzrBackend` for
+    `mirror`, which `LoggerheadBackend` does not support, and for
+    `policy`, which only `BzrBackend` uses.
+    """
+    if name == LoggerheadBackend.name:
+        return LoggerheadBackend()
+    elif name == HelperBackend.name:
+        try:
+            return HelperBackend(jobs, python, mirror)
+        except OSError as e:
+            print('{}; using bzr'.format(e), file=sys.stderr)
+    elif name in ['auto', BreezyBackend.name]:
+        try:
+            return BreezyBackend(mirror)
+        except ImportError:
+            if name == BreezyBackend.name:
+                print('breezy is not installed; using bzr',
+                      file=sys.stderr)
+
+    return BzrBackend(mirror, policy)
+
+
+def mirror_release(release, pkgs, jobs=1):
+    """Create or update the local mirror of `release`'s package branches.
+
+    The mirror is a bzr shared repository without working trees at
+    `mirror_dir(release)`. Branches of `pkgs` not in the mirror yet are
+    branched; the others are pulled, which only transfers new
+    revisions. Up to `jobs` branches are synced concurrently. Empty
+    package names, like the one after the trailing newline of a
+    packages list, are skipped.
+
+    Returns list of packages that failed to sync.
+    """
+    pkgs = [pkg for pkg in pkgs if pkg]
+    md = mirror_dir(release)
+    if not os.path.isdir(os.path.join(md, '.bzr')):
+        os.makedirs(os.path.dirname(md), exist_ok=True)
+        cp = execute('bzr init-repo --no-trees {}'.format(md),
+                     out=PIPE, err=PIPE)
+        if cp.returncode != 0:
+            print('Error: Unable to create mirror {}: {}'.format(
+                md, cp.stderr.decode().strip()), file=sys.stderr)
+            sys.exit(1)
+
+    def sync(pkg):
+        local = os.path.join(md, pkg)
+        if os.path.isdir(local):
+            cmd = 'bzr pull --quiet --overwrite -d {} {}'.format(
+                local, branch_url_fmt.format(release, pkg))
+            action = 'Updated'
+        else:
+            cmd = 'bzr branch --quiet --no-tree {} {}'.format(
+                branch_url_fmt.format(release, pkg), local)
+            action = 'Mirrored'
+
+        cp = execute(cmd, out=PIPE, err=PIPE)
+        if cp.returncode != 0:
+            print('Error: Unable to mirror {}: {}'.format(
+                pkg, cp.stderr.decode().strip()), file=sys.stderr)
+            return pkg
+
+        print('{} {}'.format(action, local))
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return [pkg for pkg in executor.map(sync, pkgs) if pkg is not None]
+
+
+def slurp_gns_readme(release, pkg, incremental=False, store=None):
+    """Read and save the README.gNewSense for `pkg` in `release`.
+
+    If `incremental` is True, the README is fetched only when the
+    revision id of `pkg`'s branch differs from the one recorded when
+    the README was last saved. READMEs are saved to `store`, which
+    defaults to `TreeStore`.
+
+    Returns True if `pkg` has a README.gNewSense; False otherwise.
+    """
+    return fetch_gns_readme(release, pkg, incremental,
+                            store=store) is not None
+
+
+def call_now(func, *args):
+    """Call `func` with `args`.
+
+    This is the default `writer` of `fetch_gns_readme`.
+    """
+    return func(*args)
+
+
+def fetch_gns_readme(release, pkg, incremental=False, writer=call_now,
+                     store=None, backend=None, negative=None, revids=None):
+    """Fetch, save and return the README.gNewSense for `pkg` in `release`.
+
+    The README is fetched with `backend`, which defaults to
+    `BzrBackend`. Writes to `store` are done by calling
+    `writer(func, *args)`, which may defer or skip them. See
+    `slurp_gns_readme` for `incremental` and `store`.
+
+    If `negative`, a `NegativeCache`, is given, the README is not
+    fetched if the cache knows that `pkg` lacks one. Only READMEs that
+    the backend reported as missing are cached; failed fetches, see
+    `note_fetch_error`, are not.
+
+    `revids`, if given, maps packages to the revision id of their branch
+    read earlier in the run, like by `input_fingerprint`; it is not read
+    again.
+
+    None is returned if `pkg` does not have a README.gNewSense.
+    """
+    backend = backend or BzrBackend()
+    start = time.perf_counter()
+
+    revid = None
+    if incremental or (negative is not None and negative.check_revid):
+        revid = revids.get(pkg) if revids else None
+        if revid is None:
+            revid = backend.revision_id(release, pkg)
+
+    if known_absent(negative, pkg, revid):
+        stats.observe('fetch', time.perf_counter() - start)
+        return None
+
+    if incremental:
+        unchanged, content = read_unchanged_gns_readme(release, pkg, revid,
+                                                       store)
+        if unchanged:
+            stats.observe('fetch', time.perf_counter() - start)
+            return content
+
+    errors = fetch_errors()
+    content = backend.cat_readme(release, pkg)
+    failed = content is None and fetch_errors() > errors
+    stats.observe('fetch', time.perf_counter() - start)
+    if negative is not None and not failed:
+        negative.update(pkg, content is not None, revid)
+
+    return save_slurped_readme(content, release, pkg, revid, writer, store,
+                               failed)
+
+
+def known_absent(negative, pkg, revid):
+    """Return True if `negative` cache knows that `pkg` lacks a README.
+    """
+    if negative is None:
+        return False
+
+    absent = negative.absent(pkg, revid)
+    stats.count('negative_cache_hits' if absent else 'negative_cache_misses')
+    if absent:
+        print('README.gNewSense not found for package {} (cached)'.format(
+            pkg), file=sys.stderr)
+
+    return absent
+
+
+def parse_revision_info(cp):
+    """Return revision id from `bzr revision-info`'s completed process `cp`.
+
+    None is returned if `bzr revision-info` failed.
+    """
+    if cp.returncode != 0:
+        return None
+
+    info = cp.stdout.decode().split()
+    if len(info) < 2:
+        return None
+
+    return info[1]
+
+
+def parse_cat(cp):
+    """Return file content from `bzr cat`'s completed process `cp`.
+
+    None is returned if `bzr cat` failed.
+    """
+    if cp.returncode != 0:
+        return None
+
+    return cp.stdout
+
+
+def read_unchanged_gns_readme(release, pkg, revid, store=None):
+    """Return (unchanged, content) of `pkg`'s README.gNewSense in `store`.
+
+    `unchanged` is True if the README was saved, or recorded as absent,
+    at `revid`; `content` is then the saved README, or None if it is
+    absent. Otherwise, (False, None) is returned.
+    """
+    store = store or TreeStore()
+    if revid is None or revid != store.read_revid(release, pkg):
+        stats.count('readme_cache_misses')
+        return False, None
+
+    stats.count('readme_cache_hits')
+    content = store.read(release, pkg)
+    if content is not None:
+        print('Unchanged {}'.format(store.location(release, pkg)))
+    else:
+        print('README.gNewSense not found for package {} (unchanged)'.format(
+            pkg), file=sys.stderr)
+
+    return True, content
+
+
+def save_slurped_readme(content, release, pkg, revid=None, writer=call_now,
+                        store=None, failed=False):
+    """Save README.gNewSense `content`, bytes, of `pkg`.
+
+    `content` is None if the README was not found or, if `failed` is
+    True, could not be fetched. If `revid` is given, it is recorded as
+    the revision id of the saved README or, if the backend reported the
+    README missing, as a revision without one, which removes a
+    previously saved README; if the fetch failed, nothing is written.
+    See `fetch_gns_readme` for `writer` and `store`.
+
+    Returns the README's content as str; None if it was not found.
+    """
+    if content is not None:
+        stats.count('readmes_fetched')
+        stats.count('bytes_fetched', len(content))
+        content = content.decode()
+        writer(save_gns_readme, content, release, pkg, store)
+        if revid:
+            writer(save_gns_revid, revid, release, pkg, store)
+        return content
+    elif failed:
+        stats.count('readme_fetch_errors')
+        print('Error: Unable to fetch README.gNewSense of package {}'.format(
+            pkg), file=sys.stderr)
+        return None
+    else:
+        stats.count('readmes_missing')
+        print("README.gNewSense not found for package {}".format(pkg),
+              file=sys.stderr)
+        if revid:
+            writer(save_gns_absent, revid, release, pkg, store)
+        return None
+
+
+async def afetch_gns_readme(release, pkg, limiter, buckets=None,
+                            incremental=False, writer=call_now, store=None,
+                            negative=None, revids=None):
+    """Coroutine version of `fetch_gns_readme`.
+
+    At most as many bzr commands as `limiter`, an `asyncio.Semaphore`,
+    allows are run at once. If `buckets` is given, it maps remote hosts
+    to the `TokenBucket` that rate limits commands sent to it.
+    """
+    # time spent running bzr, excluding waits for `limiter` and
+    # `buckets`.
+    elapsed = 0
+
+    async def bzr(cmd, url):
+        nonlocal elapsed
+        async with limiter:
+            if buckets is not None:
+                await buckets[urlparse(url).hostname].acquire()
+            start = time.perf_counter()
+            cp = await aexecute('bzr {} {}'.format(cmd, url))
+            elapsed += time.perf_counter() - start
+            return cp
+
+    revid = None
+    if incremental or (negative is not None and negative.check_revid):
+        revid = revids.get(pkg) if revids else None
+        if revid is None:
+            revid = parse_revision_info(await bzr(
+                'revision-info -d', branch_url(release, pkg)))
+
+    if known_absent(negative, pkg, revid):
+        stats.observe('fetch', elapsed)
+        return None
+
+    if incremental:
+        unchanged, content = read_unchanged_gns_readme(release, pkg, revid,
+                                                       store)
+        if unchanged:
+            stats.observe('fetch', elapsed)
+            return content
+
+    cp = await bzr('cat', readme_url(release, pkg))
+    content = parse_cat(cp)
+    failed = bzr_failed(cp)
+    stats.observe('fetch', elapsed)
+    if negative is not None and not failed:
+        negative.update(pkg, content is not None, revid)
+
+    return save_slurped_readme(content, release, pkg, revid, writer, store,
+                               failed)
+
+
+def amap_gns_readmes(release, pkgs, process, jobs=1, rate=None,
+                     incremental=False, writer=call_now, store=None,
+                     negative=None, revids=None):
+    """Asyncio version of `map_gns_readmes`.
+
+    Up to `jobs` bzr subprocesses are in flight at once. If `rate` is
+    given, at most `rate` bzr commands per second are started for each
+    remote host.
+
+    Returns list of `process(pkg, content)` for each package in `pkgs`.
+    """
+    import asyncio
+
+    async def fetch(pkg, limiter, buckets):
+        content = await afetch_gns_readme(release, pkg, limiter, buckets,
+                                          incremental, writer, store,
+                                          negative, revids)
+        return process(pkg, content)
+
+    async def fetch_all():
+        limiter = asyncio.Semaphore(jobs)
+        buckets = None
+        if rate:
+            buckets = defaultdict(lambda: TokenBucket(rate))
+
+        return await asyncio.gather(
+            *[fetch(pkg, limiter, buckets) for pkg in pkgs])
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(fetch_all())
+    finally:
+        loop.close()
+
+
+def map_gns_readmes(release, pkgs, process, jobs=1, engine='threads',
+                    rate=None, incremental=False, writer=call_now,
+                    store=None, backend=None, journal=None, negative=None,
+                    executor=None, limiter=None, revids=None):
+    """Fetch README.gNewSense of each package in `pkgs` in `release`.
+
+    `process(pkg, content)` is called as soon as `pkg`'s README arrives;
+    `content` is None if `pkg` does not have a README. Returns iterator
+    over the results of `process`, in the order of `pkgs`.
+
+    When `jobs` is greater than 1, up to `jobs` READMEs are fetched
+    concurrently. `engine` is either 'threads' or 'asyncio'; `rate`,
+    the maximum number of fetches per second for each remote host, is
+    only honored by the 'asyncio' engine, which always runs the `bzr`
+    command. See `fetch_gns_readme` for `incremental`, `writer`, `store`,
+    `backend`, `negative` and `revids`.
+
+    If `journal`, a `Journal`, is given, packages it records as done are
+    not fetched again; their READMEs are read from `store`. Fetched
+    packages are recorded in it through `writer`, after their README
+    is saved.
+
+    If `executor`, a `ThreadPoolExecutor` shared with other releases,
+    is given, the 'threads' engine fetches READMEs in it instead of in
+    a pool of its own, whatever `jobs` is. If `limiter`, an
+    `AdaptiveLimiter`, is given, it bounds how many of the pool's
+    fetches are in flight at once.
+    """
+    store = store or TreeStore()
+    backend = backend or BzrBackend()
+
+    resumed = {}
+    pending = pkgs
+    if journal is not None:
+        resumed = journal.resumed(release, pkgs, store)
+        pending = [pkg for pkg in pkgs if pkg not in resumed]
+
+    def process_fetched(pkg, content):
+        if journal is not None:
+            writer(journal.record, pkg, content is not None)
+        return process(pkg, content)
+
+    def fetch(pkg):
+        args = (release, pkg, incremental, writer, store, backend, negative,
+                revids)
+        if limiter is None:
+            content = fetch_gns_readme(*args)
+        else:
+            content = limiter.run(fetch_gns_readme, *args)
+
+        return process_fetched(pkg, content)
+
+    # create the readmes directory before the workers and `writer` race
+    # for it.
+    store.prepare(release)
+
+    if engine == 'asyncio':
+        results = iter(amap_gns_readmes(release, pending, process_fetched,
+                                        jobs, rate, incremental, writer,
+                                        store, negative, revids))
+    elif executor is not None:
+        results = executor.map(fetch, pending)
+    elif jobs > 1:
+        own_executor = ThreadPoolExecutor(max_workers=jobs)
+        results = own_executor.map(fetch, pending)
+    else:
+        results = map(fetch, pending)
+
+    try:
+        for pkg in pkgs:
+            if pkg in resumed:
+                yield process(pkg, resumed[pkg])
+            else:
+                yield next(results)
+    finally:
+        if engine != 'asyncio' and executor is None and jobs > 1:
+            own_executor.shutdown()
+
+
+@stats.timed('slurp_all_gns_readmes')
+def slurp_all_gns_readmes(release, pkgs, **fetch_opts):
+    """Read and save all README.gNewSense for `pkgs` in `release`.
+
+    See `map_gns_readmes` for `fetch_opts`.
+
+    Returns list of packages in `pkgs` that does not have README.gNewSense.
+    """
+    slurped = map_gns_readmes(release, pkgs,
+                              lambda pkg, content: content is not None,
+                              **fetch_opts)
+
+    pkgs_noreadmes = [pkg for pkg, s in zip(pkgs, slurped) if not s]
+
+    return pkgs_noreadmes
+
+
+def read_gns_readme(release, pkg, store=None):
+    """Returns content of README.gNewSense for `pkg`.
+
+    If `README.gNewSense` does not exists for `pkg`, None is returned.
+    `store` defaults to `TreeStore`.
+
+    """
+    return (store or TreeStore()).read(release, pkg)
+
+
+def field_pattern(field):
+    """Return compiled pattern that matches `field`.
+
+    The pattern is compiled once for each field; group 1 of a match is
+    the field's value.
+    """
+    pattern = _field_patterns.get(field)
+
+    if pattern is None:
+        pattern = re.compile(r'{}:[ ]*(.+)'.format(re.escape(field)))
+        _field_patterns[field] = pattern
+
+    return pattern
+
+
+def slurp_fields_from_readme(content, fields=None):
+    """Returns dict containing fields slurped from `content`.
+
+    - `fields` defaults to `field_list`.
+
+    - If a field is not defined or if its value is empty in the
+    `content`, then its corresponding value in the dict will be None.
+
+    - If a field is defined more than once, its first definition is
+    used.
+
+    - Each field is searched for on its own, so a field may be found
+    inside the value of another one on the same line.
+
+    """
+    if fields is None:
+        fields = field_list
+
+    field_values = {}
+    for field in fields:
+        field_match = None
+        # cheap substring test to skip fields that are not in `content`.
+        if field + ':' in content:
+            field_match = field_pattern(field).search(content)
+
+        if field_match and field_match.group(1).strip():
+            field_values[field] = field_match.group(1).strip()
+        else:
+            field_values[field] = None
+
+    return field_values
+
+
+@stats.timed('iter_wiki_page_data')
+def iter_wiki_page_data(release, pipeline=False, save=True, store=None,
+                        journal=None, shard=None, fields=None, **fetch_opts):
+    """Returns data needed to generate the gNewSense Debian Diff table.
+
+    The table data is returned as an iterator of (pkg, fields) tuples.
+
+    By default, READMEs of all packages in `release` are slurped first
+    and the iterator reads and parses each saved README as it is
+    consumed.
+
+    If `pipeline` is True, READMEs are fetched as the iterator is
+    consumed and each is parsed as soon as it arrives; it is saved in
+    the background if `save` is True. In this mode, the returned
+    `pkgs_noreadmes` list is filled in as the iterator is consumed.
+
+    READMEs are saved to and read from `store`, which defaults to
+    `TreeStore`. If `journal`, a `Journal`, is given, work it records
+    as done, including getting the package list, is skipped.
+
+    If `shard`, a (K, N) tuple, is given, only packages in shard K of N
+    are fetched; see `shard_packages`.
+
+    `fields` are slurped from each README; see `slurp_fields_from_readme`.
+    Parsing each README is timed as a 'parse_readme' phase of `stats`.
+    As the table data is read after this call returns, its own phase
+    only covers listing the packages and, unless `pipeline` is True,
+    fetching their READMEs.
+
+    """
+    store = store or TreeStore()
+
+    # get packages for release.
+    if journal is not None and journal.pkgs_file:
+        pkgs_file = journal.pkgs_file
+    else:
+        pkgs_file = mk_pkgs_list(release)
+        if journal is not None:
+            journal.record_listed(pkgs_file)
+    pkgs = read_packages(pkgs_file)
+    if shard is not None:
+        pkgs = shard_packages(pkgs, *shard)
+
+    if pipeline:
+        pkgs_noreadmes = []
+        return pkgs_noreadmes, iter_pipelined_table_data(
+            release, pkgs, pkgs_noreadmes, save, store=store,
+            journal=journal, fields=fields, **fetch_opts)
+
+    # get readmes for release.
+    pkgs_noreadmes = slurp_all_gns_readmes(release, pkgs, store=store,
+                                           journal=journal, **fetch_opts)
+
+    return pkgs_noreadmes, iter_table_data(release, pkgs, store, fields)
+
+
+def iter_pipelined_table_data(release, pkgs, pkgs_noreadmes, save=True,
+                              fields=None, **fetch_opts):
+    """Fetch READMEs of `pkgs` and yield (pkg, fields) as they arrive.
+
+    Packages that do not have a README are appended to
+    `pkgs_noreadmes`. READMEs are saved by a background thread if
+    `save` is True. `fields` are slurped from each README. See
+    `map_gns_readmes` for `fetch_opts`.
+    """
+    def parse(pkg, content):
+        if content:
+            with stats.phase('parse_readme'):
+                return slurp_fields_from_readme(content, fields)
+
+        return content
+
+    with ThreadPoolExecutor(max_workers=1) as saver:
+        writes = []
+        def writer(func, *args):
+            if save:
+                writes.append(saver.submit(func, *args))
+
+        table_data = map_gns_readmes(release, pkgs, parse, writer=writer,
+                                     **fetch_opts)
+        for pkg, fields in zip(pkgs, table_data):
+            if fields is None:
+                pkgs_noreadmes.append(pkg)
+            elif fields:
+                yield pkg, fields
+
+        # raise errors, if any, from the background writes.
+        for write in writes:
+            write.result()
+
+
+def iter_table_data(release, pkgs, store=None, fields=None):
+    """Yield (pkg, fields) for each package in `pkgs` that has a README.
+
+    `fields` are slurped from `pkg`'s README.gNewSense saved in `store`;
+    see `slurp_fields_from_readme`. Reading and parsing the READMEs is
+    timed as one 'iter_table_data' phase of `stats` and parsing each
+    README as a 'parse_readme' phase.
+    """
+    with stats.phase('iter_table_data'):
+        for pkg in pkgs:
+            readme_content = read_gns_readme(release, pkg, store)
+            if readme_content:
+                with stats.phase('parse_readme'):
+                    field_values = slurp_fields_from_readme(readme_content,
+                                                            fields)
+                yield pkg, field_values
+
+
+def get_wiki_page_data(release, **fetch_opts):
+    """Returns data needed to generate the gNewSense Debian Diff table.
+
+    Same as `iter_wiki_page_data`, but the table data is a dict.
+    """
+    pkgs_noreadmes, table_data = iter_wiki_page_data(release, **fetch_opts)
+
+    return pkgs_noreadmes, dict(table_data)
+
+
+def construct_table_row(release, pkg, change, reason, extra=()):
+    """Return a table row in moinmoin wiki markup.
+
+    Values in `extra` are put in columns after `reason`.
+    """
+    cells = [pkg] + [' ' if value is None else value
+                     for value in [change, reason] + list(extra)]
+
+    more_info_link = readme_link_fmt.format(release, pkg)
+
+    return '||{}||[[{}|more_info]]||'.format('||'.join(cells),
+                                           more_info_link)
+
+
+def iter_wiki_table(release, table_data):
+    """Yield newline terminated rows of the gNewSense Debian Diff table.
+
+    `table_data` is an iterable of (pkg, fields) tuples. Fields that
+    are not in `field_list` get a column each, in the order they were
+    slurped.
+    """
+    for pkg, fields in table_data:
+        change = fields['Change-Type']
+        reason = fields['Changed-From-Debian']
+        extra = [value for field, value in fields.items()
+                 if field not in field_list]
+        yield construct_table_row(release, pkg, change, reason,
+                                  extra) + '\n'
+
+
+@stats.timed('generate_wiki_table')
+def generate_wiki_table(release, **fetch_opts):
+    """Generate and return the gNewSense Debian Diff table as a string.
+    """
+    pkgs_noreadmes, table_data = iter_wiki_page_data(release, **fetch_opts)
+    wiki_table = ''.join(iter_wiki_table(release, table_data))
+
+    return pkgs_noreadmes, wiki_table
+
+
+def gns_wiki_header():
+    """Return gNewSense wiki header."""
+    from importlib import resources
+
+    header = resources.files(gns_deb_diff) / 'data' / 'wiki-header.txt'
+    return header.read_text(encoding='utf-8')
+
+
+def write_wiki_page_stream(f, release, table_data):
+    """Write the gNewSense Debian Diff wiki page to file object `f`.
+
+    Rows are written as they are generated from `table_data`, an
+    iterable of (pkg, fields) tuples.
+    """
+    f.write(gns_wiki_header())
+    f.write('\n')
+    for row in iter_wiki_table(release, table_data):
+        f.write(row)
+
+
+@stats.timed('generate_wiki_page')
+def generate_wiki_page(release, **fetch_opts):
+    """Generate and return the gNewSense Debian Diff wiki page.
+    """
+    pkgs_noreadmes, table_data = iter_wiki_page_data(release, **fetch_opts)
+
+    wiki_page = io.StringIO()
+    write_wiki_page_stream(wiki_page, release, table_data)
+
+    return pkgs_noreadmes, wiki_page.getvalue()
+
+
+def read_wiki_page(release):
+    """Read wiki page for `release` from disk.
+    """
+    wp_file = wiki_page_path(release)
+
+    if not path.isfile(wp_file):
+        return None
+
+    return read_file(wp_file)
+
+
+def write_wiki_page(release, content):
+    """Write wiki page `content` to `release`' last.rev file.
+
+    """
+    wp_file = wiki_page_path(release)
+    write_file(wp_file, content)
+
+
+def read_wiki_fingerprint(release):
+    """Return fingerprint stored for `release`' wiki page; None if none.
+    """
+    fp_file = wiki_fingerprint_path(release)
+
+    if not path.isfile(fp_file):
+        return None
+
+    return read_file(fp_file).strip()
+
+
+def write_wiki_fingerprint(release, fingerprint):
+    write_file(wiki_fingerprint_path(release), fingerprint + '\n')
+
+
+@stats.timed('input_fingerprint')
+def input_fingerprint(release, pkgs_file, backend, jobs=1, executor=None,
+                      fields=None):
+    """Return fingerprint of the inputs to `release`' wiki page.
+
+    It is a hash of gd-diff's version, the slurped `fields`, which
+    default to `field_list`, the
+    package list in `pkgs_file` and the revision id of each package's
+    branch, read with `backend` by up to `jobs` threads, or in
+    `executor` if given. The fingerprint is None if a revision id could
+    not be read.
+
+    Returns (fingerprint, revids); `revids` maps each package whose
+    revision id was read to it, for `fetch_gns_readme` to reuse.
+    """
+    pkgs = [pkg for pkg in read_packages(pkgs_file) if pkg]
+
+    def revision_id(pkg):
+        return backend.revision_id(release, pkg)
+
+    if executor is not None:
+        revids = list(executor.map(revision_id, pkgs))
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            revids = list(executor.map(revision_id, pkgs))
+
+    read = {pkg: revid for pkg, revid in zip(pkgs, revids)
+            if revid is not None}
+    if len(read) < len(pkgs):
+        return None, read
+
+    h = hashlib.sha1()
+    h.update('{}\n{}\n'.format(__version__,
+                               ' '.join(fields or field_list)).encode())
+    for pkg, revid in zip(pkgs, revids):
+        h.update('{} {}\n'.format(pkg, revid).encode())
+
+    return h.hexdigest(), read
+
+
+def get_wiki_mc(url, user, passwd): # pragma: no cover
+    """Return instance of `xmlprc.client.MultiCall` object.
+
+    """
+    from xmlrpc.client import ServerProxy, MultiCall, Fault, ProtocolError
+
+    url = urljoin(url, '?action=xmlrpc2')
+    conn = ServerProxy(url, allow_none=True)
+
+    try:
+        token = conn.getAuthToken(user, passwd)
+    except Fault as f:
+        print(f.faultString)
+        exit(1)
+    except ProtocolError as p:
+        print('Protocal Error: {} {}'.format(p.errcode, p.errmsg))
+        exit(1)
+
+    mc = MultiCall(conn)
+    mc.applyAuthToken(token)
+
+    return mc
+
+
+def wiki_page_name(version):
+    """Return name of the wiki page of gNewSense `version`."""
+    return '/'.join(['Documentation', str(version), 'DifferencesWithDebian'])
+
+
+@stats.timed('push_wiki_page')
+def push_wiki_pages(url, user, passwd, pages):
+    """Push wiki pages to wiki at `url` with a single `MultiCall`.
+
+    `pages` is a list of (version, content) tuples.
+    """
+    from xmlrpc.client import Fault
+
+    def process_result(r, f=None):
+        if(r == 'SUCCESS'):
+            print('auth success.')
+        elif(r == True):
+            print('wiki page updated.')
+        elif(f and f.faultCode == 'INVALID'):
+            print('auth failure')
+        elif(f and f.faultCode == 1):
+            print('wiki page not updated.')
+
+
+    mc = get_wiki_mc(url, user, passwd)
+    for version, content in pages:
+        mc.putPage(wiki_page_name(version), content)
+
+    results = mc()
+    # the first result is of `applyAuthToken`.
+    for i in range(len(pages) + 1):
+        try:
+            process_result(results[i])
+        except Fault as f:
+            process_result(None, f)
+            if i == 0:
+                return
+
+
+def push_wiki_page(url, user, passwd, version, content):
+    """Push `version`' wiki page to wiki at `url`.
+
+    """
+    push_wiki_pages(url, user, passwd, [(version, content)])
+
+
+def get_fields(args):
+    """Return fields to slurp: `field_list` and the `args.fields` extras.
+    """
+    return field_list + [field for field in args.fields
+                         if field not in field_list]
+
+
+def get_fetch_opts(args):
+    """Return README fetch options from command line `args`.
+
+    The options are passed down to `iter_wiki_page_data`.
+    """
+    return {
+        'fields': get_fields(args),
+        'jobs': args.jobs,
+        'engine': args.engine,
+        'rate': args.rate,
+        'incremental': args.incremental,
+        'pipeline': args.pipeline,
+        'save': not args.no_save,
+    }
+
+
+def get_fetch_policy(args):
+    """Return `FetchPolicy` from command line `args`; None if not needed.
+    """
+    if args.fetch_timeout is None and not args.hedge:
+        return None
+
+    return FetchPolicy(args.fetch_timeout, args.retries, args.hedge)
+
+
+def get_limiter(args):
+    """Return `AdaptiveLimiter` from command line `args`; None if not needed.
+    """
+    if not args.adaptive:
+        return None
+
+    return AdaptiveLimiter(args.jobs)
+
+
+def add_fetch_policy_args(parser):
+    """Add the options of `get_fetch_policy` to `parser`."""
+    parser.add_argument('--fetch-timeout', type=float, metavar='SECONDS',
+                        help='kill a bzr command that runs longer and retry '
+                        'it (bzr backend only)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='times a timed out bzr command is retried, '
+                        'with exponential backoff')
+    parser.add_argument('--hedge', action='store_true',
+                        help='start a duplicate of a bzr command that runs '
+                        'longer than the p95 so far; the first to finish '
+                        'wins (bzr backend only)')
+
+
+def check_fetch_policy_args(parser, args):
+    """Check the options of `get_fetch_policy` in `args`.
+
+    They need the `bzr` backend, which 'auto' is turned into.
+    """
+    if args.fetch_timeout is None and not args.hedge:
+        return
+
+    if args.backend not in ['auto', 'bzr']:
+        parser.error('--fetch-timeout and --hedge require --backend bzr')
+    args.backend = 'bzr'
+
+
+# state of the run on one release in `make_push`.
+PageRun = namedtuple('PageRun', ['release', 'version', 'backend', 'journal',
+                                 'negative'])
+
+
+def make_page(release, args, store, backend, journal, negative=None,
+              executor=None, limiter=None):
+    """Make `release`' wiki page for `make_push`.
+
+    Returns (pkgs_noreadmes, wiki_page, fingerprint); the fingerprint is
+    None unless `args.fingerprint` is set. With `args.fingerprint`, None
+    is returned instead if the inputs of the last generated page did not
+    change. README fetches run in `executor` and are limited by
+    `limiter` when they are given. Revision ids read for the fingerprint
+    are not read again by the fetches.
+    """
+    fingerprint = None
+    revids = None
+    if args.fingerprint:
+        # the package list is shared with the page generation below.
+        if not journal.pkgs_file:
+            journal.record_listed(mk_pkgs_list(release))
+
+        fingerprint, revids = input_fingerprint(release, journal.pkgs_file,
+                                                backend, args.jobs, executor,
+                                                get_fields(args))
+        if (fingerprint is not None and
+            path.isfile(wiki_page_path(release)) and
+            fingerprint == read_wiki_fingerprint(release)):
+            return None
+
+    fetch_opts = get_fetch_opts(args)
+    if executor is not None:
+        fetch_opts['executor'] = executor
+    if limiter is not None:
+        fetch_opts['limiter'] = limiter
+    if revids is not None:
+        fetch_opts['revids'] = revids
+
+    pkgs_noreadmes, wiki_page = generate_wiki_page(
+        release, store=store, backend=backend, journal=journal,
+        negative=negative, **fetch_opts)
+
+    return pkgs_noreadmes, wiki_page, fingerprint
+
+
+def make_push(args):
+    """make wiki pages and push them.
+
+    A page is made for each (release, version) in `args.pages`. When
+    there are several, the releases are made concurrently, their
+    READMEs are fetched by one pool of `args.jobs` threads and the
+    changed pages are pushed together.
+
+    Returns None if no page changed; otherwise the config and a list of
+    (release, pkgs_noreadmes, old_wiki_page, wiki_page) tuples, one per
+    pushed page.
+    """
+    batch = len(args.pages) > 1
+
+    def note(release, msg):
+        print('{}: {}'.format(release, msg) if batch else msg)
+
+    # create the directories of each release before its run races the
+    # others for them.
+    paths = [resolve_paths(release) for release, _ in args.pages]
+    store = open_readme_store(args.store, paths)
+    backends = {}
+    runs = []
+    scheduler = None
+    limiter = get_limiter(args)
+    try:
+        for release, version in args.pages:
+            mirror = mirror_dir(release) if args.mirror else None
+            if mirror not in backends:
+                backends[mirror] = open_backend(args.backend, args.jobs,
+                                                args.helper_python, mirror,
+                                                get_fetch_policy(args))
+
+            negative = None
+            if args.negative_ttl:
+                negative = NegativeCache(negative_cache_path(release),
+                                         args.negative_ttl * 3600,
+                                         args.negative_revid)
+
+            runs.append(PageRun(release, version, backends[mirror],
+                                Journal(journal_path(release), args.resume),
+                                negative))
+
+        def make(page_run):
+            return make_page(page_run.release, args, store, page_run.backend,
+                             page_run.journal, page_run.negative, scheduler,
+                             limiter)
+
+        # the asyncio engine bounds fetches per release; its releases are
+        # made one after the other.
+        if batch and args.engine != 'asyncio':
+            http_cache_dir()
+            scheduler = ThreadPoolExecutor(max_workers=args.jobs)
+            with ThreadPoolExecutor(max_workers=len(runs)) as releases:
+                made = list(releases.map(make, runs))
+        else:
+            made = list(map(make, runs))
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown()
+        for backend in backends.values():
+            backend.close()
+        store.close()
+        for page_run in runs:
+            page_run.journal.close()
+            if page_run.negative is not None:
+                page_run.negative.save()
+
+    changed = []
+    for page_run, result in zip(runs, made):
+        if result is None:
+            note(page_run.release, 'no changes.')
+            page_run.journal.remove()
+            continue
+
+        pkgs_noreadmes, wiki_page, fingerprint = result
+        old_wiki_page = read_wiki_page(page_run.release)
+        if old_wiki_page == wiki_page:
+            note(page_run.release, 'no changes.')
+            if fingerprint is not None:
+                write_wiki_fingerprint(page_run.release, fingerprint)
+            page_run.journal.remove()
+            continue
+
+        changed.append((page_run, pkgs_noreadmes, old_wiki_page, wiki_page,
+                        fingerprint))
+
+    if not changed:
+        return None
+
+    # configure if needed.
+    if not configured_p():
+        configure()
+
+    # read configuration.
+    config = read_config_file()
+
+    for page_run, _, _, wiki_page, _ in changed:
+        write_wiki_page(page_run.release, wiki_page)
+    push_wiki_pages(gns_wiki, config['user'], config['pass'],
+                    [(page_run.version, wiki_page)
+                     for page_run, _, _, wiki_page, _ in changed])
+    for page_run, _, _, _, fingerprint in changed:
+        if fingerprint is not None:
+            write_wiki_fingerprint(page_run.release, fingerprint)
+        page_run.journal.remove()
+
+    return config, [(page_run.release, pkgs_noreadmes, old_wiki_page,
+                     wiki_page)
+                    for page_run, pkgs_noreadmes, old_wiki_page, wiki_page, _
+                    in changed]
+
+
+def make_shard(args):
+    """Fetch and parse one shard of a release and write its artifact.
+
+    `args.shard` is a (K, N) tuple. Only READMEs of packages in shard K
+    of N of `args.release` are fetched; their table data is written to
+    the artifact at `shard_path` for `merge` to combine. Returns the
+    artifact's path.
+    """
+    release = args.release
+    shard, shards = args.shard
+
+    store = open_readme_store(args.store, resolve_paths(release))
+    mirror = mirror_dir(release) if args.mirror else None
+    backend = open_backend(args.backend, args.jobs, args.helper_python,
+                           mirror, get_fetch_policy(args))
+    journal = Journal(journal_path(release), args.resume)
+    negative = None
+    if args.negative_ttl:
+        negative = NegativeCache(negative_cache_path(release),
+                                 args.negative_ttl * 3600, args.negative_revid)
+    try:
+        # the package list is shared with the fetches below.
+        if not journal.pkgs_file:
+            journal.record_listed(mk_pkgs_list(release))
+        listing = read_file(journal.pkgs_file)
+        index = {pkg: i for i, pkg in enumerate(read_packages(
+            journal.pkgs_file))}
+
+        pkgs_noreadmes, table_data = iter_wiki_page_data(
+            release, store=store, backend=backend, journal=journal,
+            negative=negative, shard=args.shard, limiter=get_limiter(args),
+            **get_fetch_opts(args))
+        rows = [[index[pkg], pkg, fields] for pkg, fields in table_data]
+    finally:
+        backend.close()
+        store.close()
+        journal.close()
+        if negative is not None:
+            negative.save()
+
+    artifact = {
+        'release': release,
+        'shard': shard,
+        'shards': shards,
+        'listing': hashlib.sha1(listing.encode()).hexdigest(),
+        'pkgs_noreadmes': pkgs_noreadmes,
+        'table_data': rows,
+    }
+    spath = shard_path(release, shard, shards)
+    write_file(spath + '.tmp', json.dumps(artifact))
+    os.replace(spath + '.tmp', spath)
+    journal.remove()
+    print('Wrote shard {}/{} of {} to {}'.format(shard, shards, release,
+                                                 spath))
+
+    return spath
+
+
+def merge_shards(release, artifacts):
+    """Combine shard `artifacts` of `release`.
+
+    `artifacts` are the loaded artifacts written by `make_shard`; each
+    shard of the same partition of the same package list must be given
+    exactly once. Returns (pkgs_noreadmes, table_data) as
+    `iter_wiki_page_data` does for the whole release.
+    """
+    def fail(msg):
+        print('Error: {}'.format(msg), file=sys.stderr)
+        sys.exit(1)
+
+    if not artifacts:
+        fail('no shards of {} to merge'.format(release))
+
+    first = artifacts[0]
+    for artifact in artifacts:
+        if artifact['release'] != release:
+            fail('shard {}/{} is of release {}'.format(
+                artifact['shard'], artifact['shards'], artifact['release']))
+        if artifact['shards'] != first['shards']:
+            fail('shards of both {} and {} shard partitions given'.format(
+                first['shards'], artifact['shards']))
+        if artifact['listing'] != first['listing']:
+            fail('shards were made from different package lists of {}'.format(
+                release))
+
+    shards = first['shards']
+    given = sorted(artifact['shard'] for artifact in artifacts)
+    if given != list(range(1, shards + 1)):
+        fail('expected shards 1 to {} of {} once each; got {}'.format(
+            shards, release, ', '.join(str(s) for s in given)))
+
+    pkgs_noreadmes = []
+    rows = []
+    for artifact in artifacts:
+        pkgs_noreadmes.extend(artifact['pkgs_noreadmes'])
+        rows.extend(artifact['table_data'])
+    rows.sort(key=lambda row: row[0])
+
+    return pkgs_noreadmes, [(pkg, fields) for _, pkg, fields in rows]
+
+
+def parse_shard(value):
+    """Return (K, N) tuple of `--shard` `value`, given as K/N."""
+    try:
+        shard, shards = [int(n) for n in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid shard {!r}; expected K/N'.format(value))
+
+    if not 1 <= shard <= shards:
+        raise argparse.ArgumentTypeError(
+            'invalid shard {!r}; K must be from 1 to N'.format(value))
+
+    return shard, shards
+
+
+def parse_pages(parser, words):
+    """Return list of (release, version) tuples given on the command line.
+
+    `words` is either RELEASE VERSION or a list of RELEASE:VERSION.
+    """
+    if len(words) == 2 and ':' not in ''.join(words):
+        words = [':'.join(words)]
+
+    pages = []
+    for word in words:
+        release, sep, version = word.partition(':')
+        if not (release and sep and version.isdigit()):
+            parser.error('invalid page {!r}; expected RELEASE:VERSION'.format(
+                word))
+        if release in [r for r, _ in pages]:
+            parser.error('release {} given more than once'.format(release))
+        pages.append((release, int(version)))
+
+    return pages
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--version', action='version', version=__version__)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of READMEs to fetch concurrently')
+    parser.add_argument('--engine', choices=['threads', 'asyncio'],
+                        default='threads',
+                        help='concurrency engine used to fetch READMEs')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='max. README fetches per second for each host '
+                        '(asyncio engine only)')
+    parser.add_argument('--field', dest='fields', action='append',
+                        default=[], metavar='FIELD',
+                        help='extra README.gNewSense field to slurp; may be '
+                        'given more than once')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch READMEs whose branch revision '
+                        'changed since the last run')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='parse each README as soon as it is fetched '
+                        'and save it in the background')
+    parser.add_argument('--no-save', action='store_true',
+                        help='do not save READMEs to disk (--pipeline only)')
+    parser.add_argument('--backend',
+                        choices=['auto', 'bzr', 'breezy', 'helper',
+                                 'loggerhead'],
+                        default='auto',
+                        help='how package branches are read; auto uses '
+                        'breezy in-process when installed, bzr otherwise; '
+                        'helper uses one long-lived helper process per job; '
+                        'loggerhead downloads READMEs over HTTP')
+    parser.add_argument('--helper-python', metavar='PYTHON',
+                        help='interpreter, with breezy or bzrlib, that '
+                        'runs the helpers; defaults to this one')
+    parser.add_argument('--store', choices=['tree', 'sqlite'],
+                        default='tree',
+                        help='where fetched READMEs are saved')
+    parser.add_argument('--negative-ttl', type=float, metavar='HOURS',
+                        help='skip packages found to lack a README in the '
+                        'last HOURS hours')
+    parser.add_argument('--negative-revid', action='store_true',
+                        help='also fetch READMEs of packages whose branch '
+                        'changed since they were found to lack one')
+    parser.add_argument('--fingerprint', action='store_true',
+                        help='skip the run if the package list and branch '
+                        'revisions did not change since the last page')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip packages fetched by an earlier run on '
+                        'the release that did not finish')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write timings and counters of the run to FILE '
+                        'as JSON')
+    parser.add_argument('--mirror', action='store_true',
+                        help='read branches from the local mirror made by '
+                        '`gd-diff mirror`')
+    add_fetch_policy_args(parser)
+    parser.add_argument('--adaptive', action='store_true',
+                        help='adjust the number of READMEs fetched at once, '
+                        'up to --jobs, to the latency and errors of the '
+                        'fetches')
+    parser.add_argument('--coordinate', action='store_true',
+                        help='queue the packages for `gd-diff worker` '
+                        'processes and make the page from their results')
+    parser.add_argument('--queue', metavar='PATH',
+                        help='work queue database; defaults to queue.db in '
+                        'the config directory')
+    parser.add_argument('--lease', type=float, default=300,
+                        metavar='SECONDS',
+                        help='seconds a worker may take on a package before '
+                        'it is handed to another worker')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='number of local workers the coordinator '
+                        'starts')
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help='only fetch shard K of N of the release and '
+                        'write it for `gd-diff merge` instead of pushing')
+    parser.add_argument('pages', nargs='+', metavar='RELEASE[:VERSION]',
+                        help='gNewSense release name and version number, '
+                        'as RELEASE VERSION or as one or more '
+                        'RELEASE:VERSION pairs')
+    parser.set_defaults(func=make_push)
+
+    argv = sys.argv[1:]
+    if argv and argv[0] in commands:
+        parser = commands[argv[0]]()
+        args = parser.parse_args(argv[1:])
+        if 'hedge' in args:
+            check_fetch_policy_args(parser, args)
+        return args
+
+    args = parser.parse_args(argv)
+    args.pages = parse_pages(parser, args.pages)
+    args.release, args.version = (args.pages[0] if len(args.pages) == 1
+                                  else (None, None))
+    if args.mirror and args.engine == 'asyncio':
+        parser.error('--mirror cannot be used with --engine asyncio')
+    if args.mirror and args.backend == 'loggerhead':
+        parser.error('--mirror cannot be used with --backend loggerhead')
+    if args.rate is not None and args.engine != 'asyncio':
+        parser.error('--rate requires --engine asyncio')
+    if args.engine == 'asyncio':
+        if args.backend not in ['auto', 'bzr']:
+            parser.error('--engine asyncio requires --backend bzr')
+        if args.fetch_timeout is not None or args.hedge:
+            parser.error('--fetch-timeout and --hedge cannot be used with '
+                         '--engine asyncio')
+        if args.adaptive:
+            parser.error('--adaptive cannot be used with --engine asyncio')
+        args.backend = 'bzr'
+    check_fetch_policy_args(parser, args)
+    if args.no_save and not args.pipeline:
+        parser.error('--no-save requires --pipeline')
+    if args.no_save and args.incremental:
+        parser.error('--no-save cannot be used with --incremental')
+    if args.negative_revid and not args.negative_ttl:
+        parser.error('--negative-revid requires --negative-ttl')
+    if args.no_save and args.resume:
+        parser.error('--no-save cannot be used with --resume')
+    if args.shard:
+        if len(args.pages) > 1:
+            parser.error('--shard takes a single RELEASE VERSION')
+        if args.fingerprint:
+            parser.error('--shard cannot be used with --fingerprint')
+        if args.no_save:
+            parser.error('--shard cannot be used with --no-save')
+        args.func = make_shard
+    if args.coordinate:
+        if len(args.pages) > 1:
+            parser.error('--coordinate takes a single RELEASE VERSION')
+        if args.shard:
+            parser.error('--coordinate cannot be used with --shard')
+        args.func = coordinate
+    elif args.workers:
+        parser.error('--workers requires --coordinate')
+
+    return args
+
+
+def migrate(args):
+    """Copy READMEs from the 'tree' store to the 'sqlite' store.
+    """
+    src = open_readme_store('tree')
+    dst = open_readme_store('sqlite')
+    try:
+        copied = migrate_readmes(src, dst, args.releases or None)
+    finally:
+        dst.close()
+
+    print('Migrated {} READMEs to {}'.format(copied, dst.db_path))
+
+    return copied
+
+
+def migrate_parser():
+    parser = argparse.ArgumentParser(
+        prog='gd-diff migrate',
+        description='Copy saved READMEs from the directory tree to the '
+        'SQLite store.')
+    parser.add_argument('releases', nargs='*', metavar='release',
+                        help='release to migrate; all by default')
+    parser.set_defaults(func=migrate)
+
+    return parser
+
+
+def publish_wiki_page(release, version, pkgs_noreadmes, table_data):
+    """Write `release`' wiki page from `table_data` and push it.
+
+    Nothing is pushed if the page did not change; None is returned.
+    Otherwise returns config, `pkgs_noreadmes`, the old and the new
+    wiki page.
+    """
+    wiki_page = io.StringIO()
+    write_wiki_page_stream(wiki_page, release, table_data)
+    wiki_page = wiki_page.getvalue()
+
+    old_wiki_page = read_wiki_page(release)
+    if old_wiki_page == wiki_page:
+        print('no changes.')
+        return None
+
+    # configure if needed.
+    if not configured_p():
+        configure()
+
+    # read configuration.
+    config = read_config_file()
+
+    write_wiki_page(release, wiki_page)
+    push_wiki_pages(gns_wiki, config['user'], config['pass'],
+                    [(version, wiki_page)])
+
+    return config, pkgs_noreadmes, old_wiki_page, wiki_page
+
+
+def merge(args):
+    """Merge shards of a release into its wiki page and push it.
+    """
+    release = args.release
+    spaths = args.shards
+    if not spaths:
+        sd = shards_dir(release)
+        spaths = [path.join(sd, f) for f in sorted(os.listdir(sd))
+                  if f.endswith('.json')]
+
+    pkgs_noreadmes, table_data = merge_shards(
+        release, [json.loads(read_file(spath)) for spath in spaths])
+
+    return publish_wiki_page(release, args.version, pkgs_noreadmes,
+                             table_data)
+
+
+def merge_parser():
+    parser = argparse.ArgumentParser(
+        prog='gd-diff merge',
+        description='Combine the shards written by `gd-diff --shard` into '
+        "the release's wiki page and push it.")
+    parser.add_argument('release', help='gNewSense release name')
+    parser.add_argument('version', help='gNewSense version number',
+                        type=int)
+    parser.add_argument('shards', nargs='*', metavar='shard',
+                        help='shard file to merge; all shards written on '
+                        'this machine by default')
+    parser.set_defaults(func=merge)
+
+    return parser
+
+
+def start_worker(args):
+    """Start a local `gd-diff worker` for the coordinator `args`.
+
+    The worker runs this module as a script with the coordinator's
+    interpreter, so it runs the same code whether or not it is
+    installed.
+    """
+    cmd = [sys.executable, path.abspath(__file__), 'worker',
+           '--queue', args.queue,
+           '--lease', str(args.lease), '--jobs', str(args.jobs),
+           '--backend', args.backend, '--store', args.store]
+    if args.helper_python:
+        cmd += ['--helper-python', args.helper_python]
+    if args.mirror:
+        cmd.append('--mirror')
+    if args.fetch_timeout is not None:
+        cmd += ['--fetch-timeout', str(args.fetch_timeout),
+                '--retries', str(args.retries)]
+    if args.hedge:
+        cmd.append('--hedge')
+    for field in args.fields:
+        cmd += ['--field', field]
+
+    return Popen(cmd + [args.release])
+
+
+def coordinate(args):
+    """Make a release's wiki page with `gd-diff worker` processes.
+
+    The release's packages are put in the `WorkQueue` at `args.queue`,
+    `args.workers` local workers are started and, once workers have
+    completed every package, the wiki page is made from their results
+    and pushed.
+    """
+    release = args.release
+    args.queue = args.queue or work_queue_path()
+    pkgs = read_packages(mk_pkgs_list(release))
+
+    work = WorkQueue(args.queue)
+    procs = []
+    try:
+        queued = work.fill(release, pkgs)
+        procs = [start_worker(args) for _ in range(args.workers)]
+
+        while True:
+            counts = work.progress(release)
+            if counts['done'] == queued:
+                break
+            if procs and all(p.poll() is not None for p in procs):
+                print('Error: all workers exited; {} of {} packages '
+                      'are done'.format(counts['done'], queued),
+                      file=sys.stderr)
+                sys.exit(1)
+            time.sleep(work_queue_poll)
+
+        pkgs_noreadmes, table_data = work.results(release)
+    finally:
+        # workers exit once the release is finished.
+        work.finish(release)
+        for p in procs:
+            p.wait()
+        work.close()
+
+    return publish_wiki_page(release, args.version, pkgs_noreadmes,
+                             table_data)
+
+
+def worker(args):
+    """Fetch and parse packages claimed from a `WorkQueue`.
+
+    Each of `args.jobs` threads claims a package of `args.release`,
+    fetches and parses its README and completes it. A package whose
+    fetch failed is not completed; its lease runs out and it is claimed
+    again. Workers may start before the release is queued; they wait
+    for packages until the coordinator marks the release finished or,
+    if `args.wait` is given, until they have had nothing to claim for
+    `args.wait` seconds.
+    Returns the number of packages completed.
+    """
+    import socket
+
+    release = args.release
+    store = open_readme_store(args.store, resolve_paths(release))
+    mirror = mirror_dir(release) if args.mirror else None
+    backend = open_backend(args.backend, args.jobs, args.helper_python,
+                           mirror, get_fetch_policy(args))
+    work = WorkQueue(args.queue or work_queue_path())
+    slurped = get_fields(args)
+    completed = []
+
+    def run():
+        name = '{}:{}:{}'.format(socket.gethostname(), os.getpid(),
+                                 threading.get_ident())
+        idle_since = None
+        while True:
+            pkg = work.claim(release, name, args.lease)
+            if pkg is None:
+                # wait for the release to be queued and for leases of
+                # other workers to be completed or to run out.
+                if work.release_state(release) == 'finished':
+                    return
+                if idle_since is None:
+                    idle_since = time.monotonic()
+                elif (args.wait is not None and
+                      time.monotonic() - idle_since >= args.wait):
+                    return
+                time.sleep(work_queue_poll)
+                continue
+            idle_since = None
+
+            errors = fetch_errors()
+            content = fetch_gns_readme(release, pkg, store=store,
+                                       backend=backend)
+            if content is None and fetch_errors() > errors:
+                continue
+            fields = (slurp_fields_from_readme(content, slurped)
+                      if content else None)
+            if work.complete(release, pkg, name, fields):
+                completed.append(pkg)
+
+    try:
+        threads = [threading.Thread(target=run) for _ in range(args.jobs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        backend.close()
+        store.close()
+        work.close()
+
+    return len(completed)
+
+
+def worker_parser():
+    parser = argparse.ArgumentParser(
+        prog='gd-diff worker',
+        description="Fetch and parse a release's packages claimed from the "
+        'work queue of `gd-diff --coordinate`.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of READMEs to fetch concurrently')
+    parser.add_argument('--queue', metavar='PATH',
+                        help='work queue database; defaults to queue.db in '
+                        'the config directory')
+    parser.add_argument('--lease', type=float, default=300,
+                        metavar='SECONDS',
+                        help='seconds a claimed package is kept from other '
+                        'workers')
+    parser.add_argument('--wait', type=float, default=None,
+                        metavar='SECONDS',
+                        help='exit after finding nothing to claim for '
+                        'SECONDS; by default, wait until the coordinator '
+                        'finishes the release')
+    parser.add_argument('--backend',
+                        choices=['auto', 'bzr', 'breezy', 'helper',
+                                 'loggerhead'],
+                        default='auto',
+                        help='how package branches are read')
+    parser.add_argument('--helper-python', metavar='PYTHON',
+                        help='interpreter that runs the helpers')
+    parser.add_argument('--store', choices=['tree', 'sqlite'],
+                        default='tree',
+                        help='where fetched READMEs are saved')
+    parser.add_argument('--mirror', action='store_true',
+                        help='read branches from the local mirror')
+    parser.add_argument('--field', dest='fields', action='append',
+                        default=[], metavar='FIELD',
+                        help='extra README.gNewSense field to slurp; may be '
+                        'given more than once')
+    add_fetch_policy_args(parser)
+    parser.add_argument('release', help='gNewSense release name')
+    parser.set_defaults(func=worker)
+
+    return parser
+
+
+def mirror(args):
+    """Create or update the local mirror of a release's branches.
+    """
+    pkgs = read_packages(mk_pkgs_list(args.release))
+    failed = mirror_release(args.release, pkgs, args.jobs)
+    if failed:
+        print('Error: {} of {} branches failed to mirror'.format(
+            len(failed), len(pkgs)), file=sys.stderr)
+        sys.exit(1)
+
+    return pkgs
+
+
+def mirror_parser():
+    parser = argparse.ArgumentParser(
+        prog='gd-diff mirror',
+        description="Create or update a local mirror of a release's "
+        'package branches; use it with --mirror.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of branches to sync concurrently')
+    parser.add_argument('release', help='gNewSense release name')
+    parser.set_defaults(func=mirror)
+
+    return parser
+
+
+# sub-commands; maps command name to function returning its parser.
+commands = {
+    'merge': merge_parser,
+    'migrate': migrate_parser,
+    'mirror': mirror_parser,
+    'worker': worker_parser,
+}
 
 
 def main():
     args = get_args()
-    make_push(args)
+    try:
+        args.func(args)
+    finally:
+        if getattr(args, 'stats', None):
+            stats.dump(args.stats)
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+#  This file is part of gns-deb-diff.
+#
+#  gns-deb-diff is under the Public Domain. See
+#  <https://creativecommons.org/publicdomain/zero/1.0>
+
+"""Long-lived helper that reads bzr branches for gd-diff.
+
+Run as `PYTHON bzr_helper.py`, where PYTHON has breezy or bzrlib
+installed; Python 2 and 3 are supported. It does not import gd_diff.
+
+On startup it writes `ready` or `error MESSAGE` on a line. It then
+reads one request per line from stdin:
+
+    cat BRANCH_URL FILE_PATH
+    revision-info BRANCH_URL
+
+and answers each with `ok LENGTH` on a line followed by LENGTH bytes,
+with `missing` on a line if the branch or file does not exist, or with
+`error MESSAGE` on a line if reading failed otherwise.
+Transports are kept open per host for the life of the helper.
+"""
+
+import sys
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+
+def import_bzr():
+    """Import, initialize and return breezy or, failing that, bzrlib."""
+    try:
+        import breezy as bzr
+        import breezy.branch
+        import breezy.errors
+        import breezy.plugin
+        import breezy.transport
+        get_transport = breezy.transport.get_transport_from_url
+    except ImportError:
+        import bzrlib as bzr
+        import bzrlib.branch
+        import bzrlib.errors
+        import bzrlib.plugin
+        import bzrlib.transport
+        get_transport = bzrlib.transport.get_transport
+
+    bzr.initialize(setup_ui=False)
+    bzr.plugin.load_plugins()
+
+    return bzr, get_transport
+
+
+class ReadError(Exception):
+    """Reading a branch failed for a reason other than it not existing."""
+
+
+class Reader(object):
+    """Reads branches, reusing one transport per host."""
+
+    def __init__(self):
+        self.bzr, self.get_transport = import_bzr()
+        self.transports = {}
+        no_such_file = getattr(self.bzr.transport, 'NoSuchFile', None)
+        self.missing_errors = (self.bzr.errors.NotBranchError,
+                               no_such_file or self.bzr.errors.NoSuchFile)
+
+
+    def open_branch(self, branch_url):
+        url = urlparse(branch_url)
+        base = '{0}://{1}/'.format(url.scheme, url.netloc)
+
+        t = self.transports.get(base)
+        if t is None:
+            t = self.get_transport(base)
+            self.transports[base] = t
+
+        return self.bzr.branch.Branch.open_from_transport(
+            t.clone(url.path.lstrip('/')))
+
+
+    def revision_info(self, branch_url):
+        return self.open_branch(branch_url).last_revision()
+
+
+    def cat(self, branch_url, file_path):
+        tree = self.open_branch(branch_url).basis_tree()
+        tree.lock_read()
+        try:
+            if self.bzr.__name__ == 'bzrlib':
+                file_id = tree.path2id(file_path)
+                if file_id is None:
+                    return None
+                return tree.get_file_text(file_id)
+            return tree.get_file_text(file_path)
+        finally:
+            tree.unlock()
+
+
+    def answer(self, request):
+        """Return the answer to `request`, a list of words; None if missing.
+
+        Raises ReadError if reading the branch failed.
+        """
+        try:
+            if request[0] == 'cat':
+                return self.cat(request[1], request[2])
+            elif request[0] == 'revision-info':
+                return self.revision_info(request[1])
+        except self.missing_errors:
+            return None
+        except (self.bzr.errors.BzrError, EnvironmentError) as e:
+            raise ReadError(' '.join(str(e).split()))
+
+        raise ValueError('unknown request {0!r}'.format(request))
+
+
+def main():
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    try:
+        reader = Reader()
+    except ImportError as e:
+        stdout.write('error {0}\n'.format(e).encode('utf-8'))
+        stdout.flush()
+        sys.exit(1)
+
+    stdout.write(b'ready\n')
+    stdout.flush()
+
+    for line in iter(stdin.readline, b''):
+        try:
+            content = reader.answer(line.decode('utf-8').split())
+        except ReadError as e:
+            stdout.write('error {0}\n'.format(e).encode('utf-8'))
+            stdout.flush()
+            continue
+
+        if content is None:
+            stdout.write(b'missing\n')
+        else:
+            stdout.write('ok {0}\n'.format(len(content)).encode('utf-8'))
+            stdout.write(content)
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
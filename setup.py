@@ -36,7 +36,7 @@ config = {
         'Intended Audience :: Developers',
         'License :: CC0 1.0 Universal (CC0 1.0) Public Domain Dedication',
         'Operating System :: POSIX :: Linux',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3 :: Only',
         'Topic :: Software Development :: Documentation',
         'Topic :: Text Processing :: General',
@@ -45,7 +45,9 @@ config = {
     'py_modules': ['gd_diff'],
     'packages': ['gns_deb_diff'],
     'include_package_data': True,
-    'install_requires': ['beautifulsoup4', 'requests'],
+    'python_requires': '>=3.9',
+    'install_requires': ['requests'],
+    'extras_require': {'breezy': ['breezy']},
     'entry_points': {
         'console_scripts': ['gd-diff = gd_diff:main']
     },
@@ -6,11 +6,15 @@
 #  gns-deb-diff is under the Public Domain. See
 #  <https://creativecommons.org/publicdomain/zero/1.0>
 
+import asyncio
 import builtins
 import json
 import os
+import shlex
+import shutil
 import subprocess
 import sys
+import threading
 import time
 import xmlrpc.client
 
@@ -18,10 +22,13 @@ import requests
 
 import gd_diff
 
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from glob import glob
 from io import StringIO
 from os import path
-from shutil import rmtree
-from unittest import mock
+from shutil import copytree, rmtree
+from socketserver import ThreadingMixIn
+from unittest import mock, SkipTest
 
 from nose.tools import *
 
@@ -29,6 +36,125 @@ from gd_diff import *
 from gns_deb_diff._version import __version__
 
 
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve_http(handler):
+    """Serve `handler` on a local port in a daemon thread.
+
+    Returns the server; its base URL is `server.url`.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+
+    return server
+
+
+def pkgs_listing(pkgs):
+    """Return loggerhead like HTML listing of `pkgs`."""
+    rows = ''.join(['<tr><td class="autcell"><a href="/{0}">{0}</a></td>'
+                    '<td class="date">2016-01-01</td></tr>\n'.format(p)
+                    for p in pkgs])
+    return '<html><body><table>\n{}</table></body></html>'.format(rows)
+
+
+class ListingHandler(BaseHTTPRequestHandler):
+    """Serves `pkgs_listing` with an ETag; records response codes."""
+    pkgs = ['antlr', 'apt', 'db4.8']
+    etag = '"listing-1"'
+    codes = []
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.etag:
+            self.codes.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = pkgs_listing(self.pkgs).encode()
+        self.codes.append(200)
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LoggerheadHandler(BaseHTTPRequestHandler):
+    """Serves files under tests/files/bzr-repo like loggerhead's download.
+
+    `/lh/gnewsense/packages-R/PKG/download/head:/FILE` is looked up as
+    `gnewsense/packages-R/PKG/FILE`. Connections are kept alive; the
+    client port of each request is recorded in `ports`.
+    """
+    protocol_version = 'HTTP/1.1'
+    root = 'tests/files/bzr-repo'
+    ports = []
+
+    def do_GET(self):
+        self.ports.append(self.client_address[1])
+
+        parts = self.path.split('/')
+        if parts[5:7] != ['download', 'head:']:
+            return self.reply(403, b'forbidden')
+
+        fpath = path.join(self.root, *(parts[2:5] + parts[7:]))
+        if not path.isfile(fpath):
+            return self.reply(404, b'not found')
+
+        with open(fpath, 'rb') as f:
+            self.reply(200, f.read())
+
+    def reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_bzr_branches(src, dest):
+    """Commit each package directory under `src` to a bzr branch.
+
+    Branches are created with breezy in a shared repository at `dest`,
+    keeping `src`'s layout. Raises `SkipTest` if breezy is missing.
+    """
+    try:
+        gd_diff.import_breezy()
+    except ImportError:
+        raise SkipTest('breezy is not installed')
+    from breezy import controldir, workingtree
+    from breezy.commit import NullCommitReporter
+
+    dest = path.abspath(dest)
+    copytree(src, dest)
+    repo = controldir.ControlDir.create(dest)
+    repo.create_repository(shared=True)
+
+    for bpath in sorted(glob(path.join(dest, '*', 'packages-*', '*'))):
+        files = [path.relpath(path.join(d, f), bpath)
+                 for d, _, fs in os.walk(bpath) for f in fs]
+        controldir.ControlDir.create_branch_convenience(
+            'file://' + bpath, force_new_tree=True)
+        tree = workingtree.WorkingTree.open(bpath)
+        tree.add(sorted(set(path.dirname(f) for f in files) - {''}) +
+                 files)
+        tree.commit('Import {}'.format(path.basename(bpath)),
+                    committer='gd-diff <gd-diff@example.org>',
+                    reporter=NullCommitReporter())
+
+    return dest
+
+
 class TestGdDiff(object):
 
     def setup(self):
@@ -40,6 +166,8 @@ class TestGdDiff(object):
         self.gns_pkgs_dir = 'tests/gns-pkgs'
         self.test_home = 'tests/HOME'
         self.test_w_file = os.path.join(self.test_home, 'w_file')
+        self.fake_bzr_path = os.pathsep.join([
+            path.abspath('tests/files/bin'), os.environ['PATH']])
 
         self.stderr_orig = sys.stderr
 
@@ -70,12 +198,12 @@ class TestGdDiff(object):
 
 
     def test_execute_success(self):
-        cmd = 'python --version'
+        cmd = '{} --version'.format(shlex.quote(sys.executable))
         cp = execute(cmd, out=subprocess.PIPE)
 
         assert cp.returncode == 0
         assert cp.stdout.split()[0] == b'Python'
-        assert cp.stdout.split()[1].startswith(b'3.5')
+        assert cp.stdout.split()[1] == sys.version.split()[0].encode()
 
 
     def test_execute_cmderror(self):
@@ -116,6 +244,47 @@ class TestGdDiff(object):
         assert_equal(pkgs, 'antlr\napt\napt-setup\nautoconf\nautoconf2.59\nautoconf2.64\nbacula\nbase-files\nbase-installer\nbatik\ncairomm\ncdebootstrap\ncfitsio3\nchoose-mirror\nclaws-mail\ndb4.6\ndb4.7\ndb4.8\ndebian-cd\ndebian-edu\ndebian-installer\ndebian-installer-launcher\ndebootstrap\ndesktop-base\ndoc-linux\ndoc-linux-hr\ndoc-linux-it\ndoc-linux-ja\ndoc-linux-pl\nenscript\nepiphany-browser\nfop\nfreetype\ngalaxia\ngdm3\nglibmm2.4\ngnewsense-archive-keyring\ngnome-desktop\ngtkmm2.4\nicedove\niceweasel\nkde4libs\nkdebase\nkdebase-workspace\nkdenetwork\nkernel-wedge\nlensfun\nliferea\nlintian\nlinux-2.6\nlinux-kernel-di-amd64-2.6\nlinux-kernel-di-i386-2.6\nlinux-latest-2.6\nlive-build\nlive-config\nmeta-gnome2\nmplayer\nnet-retriever\nobjcryst-fox\nopenbox-themes\nopenjdk-6\nopenoffice.org\npangomm\nperl-tk\npkgsel\npopularity-contest\npsutils\npython-apt\nscreenlets\nsip4-qt3\nsoftware-center\ntcl8.4\ntcl8.5\ntexlive-extra\ntk8.4\ntk8.5\nupdate-manager\nvim\nwmaker\nxchat\nxdm\nxorg-server\nxserver-xorg-video-siliconmotion\nyeeloong-base\n')
 
 
+    def test_iter_packages(self):
+        pkgs = read_packages(self.pkgs_file)[:-1]
+        html = pkgs_listing(pkgs)
+        html += ('<table><tr><td class="date"><a href="/x">not-a-pkg</a>'
+                 '</td><td class="autcell odd"><a href="/y"> gtk&amp;mm'
+                 ' </a><a href="/z">not-a-pkg</a></td></tr></table>')
+
+        for chunk_size in [7, 100, 65536]:
+            assert_equal(list(iter_packages(html, chunk_size)),
+                         pkgs + ['gtk&mm'])
+
+
+    def test_http_session(self):
+        session = http_session()
+        assert session is http_session()
+
+        adapter = session.get_adapter('http://bzr.savannah.gnu.org')
+        assert_equal(adapter.max_retries.total, gd_diff.http_retries)
+
+
+    def test_get_packages_etag(self):
+        ListingHandler.codes = []
+        server = serve_http(ListingHandler)
+        url_fmt = server.url + '/packages-{}/'
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch('gd_diff.pkgs_list_url_fmt', new=url_fmt), \
+             mock.patch('gd_diff.iter_packages',
+                        wraps=gd_diff.iter_packages) as parse:
+            pkgs_file = mk_pkgs_list('parkes')
+            assert_equal(read_file(pkgs_file), 'antlr\napt\ndb4.8\n')
+
+            # listing unchanged; not parsed again.
+            assert_equal(get_packages('parkes'), 'antlr\napt\ndb4.8\n')
+            assert_equal(ListingHandler.codes, [200, 304])
+            assert_equal(parse.call_count, 1)
+
+        server.shutdown()
+        server.server_close()
+
+
     def test_config_dir(self):
         with mock.patch('os.getenv', new=self.env_func):
             c_dir = config_dir()
@@ -175,6 +344,49 @@ class TestGdDiff(object):
             assert_equal(os.path.isdir(rd_parkes), True)
 
 
+    def test_resolve_paths(self):
+        with mock.patch('os.getenv', new=self.env_func):
+            paths = resolve_paths('parkes')
+            assert_equal(paths.release, 'parkes')
+            assert_equal(paths.config_dir, config_dir())
+            assert_equal(paths.pkgs_dir, pkgs_dir())
+            assert_equal(paths.readmes_dir, readmes_dir('parkes'))
+            assert_equal(paths.wiki_page_dir, wiki_page_dir('parkes'))
+            for d in paths[1:]:
+                assert os.path.isdir(d)
+
+
+    def test_tree_store_resolves_readmes_dir_once(self):
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch('sys.stdout', new=StringIO()):
+            store = open_readme_store('tree', resolve_paths('parkes'))
+
+            with mock.patch('gd_diff.readmes_dir',
+                            wraps=gd_diff.readmes_dir) as rd:
+                for pkg in ['antlr', 'db4.8']:
+                    save_gns_readme('Package: {}\n'.format(pkg), 'parkes',
+                                    pkg, store)
+                    save_gns_revid('rev-1', 'parkes', pkg, store)
+                    read_gns_readme('parkes', pkg, store)
+                    read_gns_revid('parkes', pkg, store)
+                assert_equal(rd.call_count, 0)
+
+                save_gns_readme('Package: antlr\n', 'ucclia', 'antlr', store)
+                read_gns_readme('ucclia', 'antlr', store)
+                assert_equal(rd.call_count, 1)
+
+                # paths of several releases.
+                store = open_readme_store('tree', [resolve_paths('parkes'),
+                                                   resolve_paths('ucclia')])
+                rd.reset_mock()
+                read_gns_readme('parkes', 'antlr', store)
+                read_gns_readme('ucclia', 'antlr', store)
+                assert_equal(rd.call_count, 0)
+
+            assert_equal(read_gns_readme('parkes', 'db4.8'),
+                         'Package: db4.8\n')
+
+
     def test_wiki_page_dir(self):
         with mock.patch('os.getenv', new=self.env_func):
             wd_parkes = wiki_page_dir('parkes')
@@ -270,6 +482,71 @@ class TestGdDiff(object):
                 assert f.read() == b'Changed-From-Debian: Removed example with non-free files.\nChange-Type: Modified\n\nFor gNewSense, the non-free unicode.IDENTs files are *actually* removed (see\nalso README.source). See gNewSense bug #34218 for details.\n'
 
 
+    def test_sqlite_store(self):
+        with mock.patch('os.getenv', new=self.env_func):
+            store = open_readme_store('sqlite')
+            assert_equal(store.db_path, path.join(config_dir(),
+                                                  'readmes.db'))
+
+            assert_equal(read_gns_readme('parkes', 'antlr', store), None)
+
+            with mock.patch('sys.stdout', new=StringIO()) as output:
+                save_gns_readme('Change-Type: Modified\n', 'parkes',
+                                'antlr', store)
+                save_gns_readme('Change-Type: Deblob\n', 'parkes',
+                                'antlr', store)
+                assert 'readmes.db:parkes/antlr' in output.getvalue()
+            save_gns_revid('rev-1', 'parkes', 'antlr', store)
+
+            assert_equal(read_gns_readme('parkes', 'antlr', store),
+                         'Change-Type: Deblob\n')
+            assert_equal(read_gns_revid('parkes', 'antlr', store), 'rev-1')
+            assert_equal(store.pkgs('parkes'), ['antlr'])
+            assert_equal(store.releases(), ['parkes'])
+
+            # nothing is written to the directory tree.
+            assert_equal(read_gns_readme('parkes', 'antlr'), None)
+
+            save_gns_absent('rev-2', 'parkes', 'antlr', store)
+            assert_equal(read_gns_readme('parkes', 'antlr', store), None)
+            assert_equal(read_gns_revid('parkes', 'antlr', store), 'rev-2')
+            assert_equal(store.pkgs('parkes'), [])
+
+            remove_gns_readme('parkes', 'antlr', store)
+            assert_equal(read_gns_readme('parkes', 'antlr', store), None)
+            assert_equal(read_gns_revid('parkes', 'antlr', store), None)
+            store.close()
+
+            # the tree store records absent READMEs too.
+            save_gns_absent('rev-3', 'parkes', 'apt')
+            assert_equal(read_gns_readme('parkes', 'apt'), None)
+            assert_equal(read_gns_revid('parkes', 'apt'), 'rev-3')
+
+
+    def test_migrate(self):
+        mock_sys_argv = ['gd-diff', 'migrate']
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stdout', new=StringIO()):
+            for pkg in ['antlr', 'db4.8']:
+                save_gns_readme('Package: {}\n'.format(pkg), 'parkes', pkg)
+            save_gns_revid('rev-1', 'parkes', 'antlr')
+            save_gns_readme('Package: antlr\n', 'ucclia', 'antlr')
+
+            args = get_args()
+            assert_equal(args.func(args), 3)
+
+            store = open_readme_store('sqlite')
+            assert_equal(store.releases(), ['parkes', 'ucclia'])
+            assert_equal(store.pkgs('parkes'), ['antlr', 'db4.8'])
+            assert_equal(read_gns_readme('parkes', 'db4.8', store),
+                         'Package: db4.8\n')
+            assert_equal(read_gns_revid('parkes', 'antlr', store), 'rev-1')
+            assert_equal(read_gns_revid('parkes', 'db4.8', store), None)
+            store.close()
+
+
     def test_slurp_gns_readme_success(self):
         with mock.patch('os.getenv', new=self.env_func):
             saved = slurp_gns_readme('parkes', 'antlr')
@@ -309,6 +586,186 @@ class TestGdDiff(object):
             assert_equal(pkgs_noreadmes, expected_pkgs_noreadmes)
 
 
+    def test_slurp_all_gns_readmes_jobs(self):
+        pkgs = read_packages(self.small_pkgs_file)
+        expected_pkgs_noreadmes = [
+            'pkg-with-no-readme',
+            'another-pkg-no-readme',
+        ]
+
+        # mock `execute`; packages early in the list take the longest.
+        def mock_execute(cmd, out=None, err=None):
+            pkg = cmd.split('/')[-3]
+            time.sleep(0.01 * (len(pkgs) - pkgs.index(pkg)) / len(pkgs))
+            if 'no-readme' in pkg:
+                return subprocess.CompletedProcess(cmd, 3, b'', b'')
+            return subprocess.CompletedProcess(
+                cmd, 0, 'Change-Type: Modified\n'.encode(), b'')
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch('gd_diff.execute', new=mock_execute), \
+             mock.patch('sys.stdout', new=StringIO()) as output, \
+             mock.patch('sys.stderr', new=StringIO()) as errput:
+            pkgs_noreadmes = slurp_all_gns_readmes('parkes', pkgs, jobs=4)
+            assert_equal(pkgs_noreadmes, expected_pkgs_noreadmes)
+
+            saved = output.getvalue().strip('\n').split('\n')
+            assert_equal(len(saved), len(pkgs) - 2)
+            for pkg in expected_pkgs_noreadmes:
+                assert 'package {}'.format(pkg) in errput.getvalue()
+                assert_equal(read_gns_readme('parkes', pkg), None)
+
+            assert_equal(read_gns_readme('parkes', 'antlr'),
+                         'Change-Type: Modified\n')
+
+
+    def test_slurp_all_gns_readmes_asyncio(self):
+        pkgs = read_packages(self.small_pkgs_file)
+        expected_pkgs_noreadmes = [p for p in pkgs
+                                   if p not in ['antlr', 'db4.8']]
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('sys.stdout', new=StringIO()) as output, \
+             mock.patch('sys.stderr', new=StringIO()):
+            pkgs_noreadmes = slurp_all_gns_readmes('parkes', pkgs, jobs=8,
+                                                   engine='asyncio')
+            assert_equal(pkgs_noreadmes, expected_pkgs_noreadmes)
+            assert_equal(len(output.getvalue().strip('\n').split('\n')), 2)
+
+            antlr_readme = read_gns_readme('parkes', 'antlr')
+            assert antlr_readme.startswith('Changed-From-Debian: Removed')
+
+
+    def test_slurp_all_gns_readmes_asyncio_rate(self):
+        pkgs = read_packages(self.tiny_pkgs_file)
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            start = time.monotonic()
+            pkgs_noreadmes = slurp_all_gns_readmes('parkes', pkgs, jobs=8,
+                                                   engine='asyncio', rate=20)
+            elapsed = time.monotonic() - start
+
+            assert_equal(len(pkgs_noreadmes), len(pkgs) - 2)
+            # 10 fetches from one host at 20/s need at least 9 waits.
+            assert elapsed >= 9 / 20
+
+
+    def test_slurp_all_gns_readmes_incremental(self):
+        pkgs = read_packages(self.tiny_pkgs_file)
+        bzr_repo = path.join(self.test_home, 'bzr-repo')
+        copytree('tests/files/bzr-repo', bzr_repo)
+        parkes = path.join(bzr_repo, 'gnewsense', 'packages-parkes')
+
+        def slurp(engine):
+            with mock.patch('sys.stdout', new=StringIO()) as output, \
+                 mock.patch('sys.stderr', new=StringIO()):
+                pkgs_noreadmes = slurp_all_gns_readmes(
+                    'parkes', pkgs, jobs=4, engine=engine, incremental=True)
+                return pkgs_noreadmes, output.getvalue()
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_ROOT': bzr_repo}):
+            pkgs_noreadmes, output = slurp('threads')
+            assert_equal(len(pkgs_noreadmes), len(pkgs) - 2)
+            assert_equal(output.count('Saved'), 2)
+            assert read_gns_revid('parkes', 'antlr').startswith('fake-')
+
+            # nothing changed.
+            pkgs_noreadmes, output = slurp('asyncio')
+            assert_equal(len(pkgs_noreadmes), len(pkgs) - 2)
+            assert_equal(output.count('Saved'), 0)
+            assert_equal(output.count('Unchanged'), 2)
+
+            # antlr changed; db4.8's README was removed.
+            with open(path.join(parkes, 'antlr', 'debian',
+                                'README.gNewSense'), 'a') as f:
+                f.write('More changes.\n')
+            os.remove(path.join(parkes, 'db4.8', 'debian',
+                                'README.gNewSense'))
+
+            pkgs_noreadmes, output = slurp('threads')
+            assert_equal(len(pkgs_noreadmes), len(pkgs) - 1)
+            assert 'db4.8' in pkgs_noreadmes
+            assert_equal(output.count('Saved'), 1)
+            assert read_gns_readme('parkes', 'antlr').endswith(
+                'More changes.\n')
+            assert_equal(read_gns_readme('parkes', 'db4.8'), None)
+            assert read_gns_revid('parkes', 'db4.8').startswith('fake-')
+
+            # db4.8 is known to lack a README at its revision; it is not
+            # fetched again.
+            with mock.patch.dict('os.environ', {'FAKE_BZR_FAIL': 'cat'}):
+                for engine in ['threads', 'asyncio']:
+                    pkgs_noreadmes, output = slurp(engine)
+                    assert 'db4.8' in pkgs_noreadmes
+                    assert 'debian-cd' in pkgs_noreadmes
+                    assert_equal(output.count('Unchanged'), 1)
+                    assert_equal(read_gns_readme('parkes', 'db4.8'), None)
+
+            # a README that fails to be fetched is kept.
+            revid = read_gns_revid('parkes', 'antlr')
+            with open(path.join(parkes, 'antlr', 'debian',
+                                'README.gNewSense'), 'a') as f:
+                f.write('Even more changes.\n')
+            for engine in ['threads', 'asyncio']:
+                with mock.patch.dict('os.environ', {'FAKE_BZR_FAIL': 'cat'}):
+                    slurp(engine)
+                assert read_gns_readme('parkes', 'antlr').endswith(
+                    'More changes.\n')
+                assert_equal(read_gns_revid('parkes', 'antlr'), revid)
+
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=50, burst=2)
+
+        async def acquire_all():
+            for i in range(6):
+                await bucket.acquire()
+
+        start = time.monotonic()
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(acquire_all())
+        loop.close()
+
+        # two tokens are free; the other four come at 50/s.
+        assert time.monotonic() - start >= 4 / 50
+
+
+    def test_stats(self):
+        st = Stats()
+        with st.phase('slurp'):
+            time.sleep(0.01)
+        with st.phase('slurp'):
+            pass
+        st.count('subprocesses')
+        st.count('bytes_fetched', 42)
+        for ms in range(1, 101):
+            st.observe('fetch', ms / 1000)
+
+        report = st.report()
+        assert_equal(report['phases']['slurp']['calls'], 2)
+        assert report['phases']['slurp']['wall'] >= 0.01
+        assert report['wall'] >= report['phases']['slurp']['wall']
+        assert_equal(report['counters'],
+                     {'subprocesses': 1, 'bytes_fetched': 42})
+
+        fetch = report['latencies']['fetch']
+        assert_equal(fetch['count'], 100)
+        assert_equal((fetch['p50'], fetch['p95'], fetch['p99'], fetch['max']),
+                     (0.05, 0.095, 0.099, 0.1))
+        assert_equal(st.summarize([0.5]),
+                     {'count': 1, 'mean': 0.5, 'max': 0.5, 'p50': 0.5,
+                      'p95': 0.5, 'p99': 0.5})
+
+        st.reset()
+        assert_equal(st.report()['counters'], {})
+
+
     def test_read_gns_readme(self):
         with mock.patch('os.getenv', new=self.env_func):
             # first download the antlr readme
@@ -369,6 +826,39 @@ class TestGdDiff(object):
         assert_equal(field_values['Changed-From-Debian'],
                      'Removed example with non-free files.')
 
+        # fields are searched for one at a time.
+        readme_content = 'Change-Type: Modified; Changed-From-Debian: Branding.\n'
+        field_values = slurp_fields_from_readme(readme_content)
+        assert_equal(field_values['Change-Type'],
+                     'Modified; Changed-From-Debian: Branding.')
+        assert_equal(field_values['Changed-From-Debian'], 'Branding.')
+
+
+    def test_slurp_fields_from_readme_extra_fields(self):
+        fields = gd_diff.field_list + ['Upstream-Bug', 'Removed-Files']
+
+        readme_content = ('Change-Type: Deblob\nRemoved-Files: a.bin b.bin\n'
+                          'Change-Type: Modified\nUpstream-Bug: \n')
+        field_values = slurp_fields_from_readme(readme_content, fields)
+        assert_equal(list(field_values.keys()), fields)
+        assert_equal(field_values['Change-Type'], 'Deblob')
+        assert_equal(field_values['Changed-From-Debian'], None)
+        assert_equal(field_values['Upstream-Bug'], None)
+        assert_equal(field_values['Removed-Files'], 'a.bin b.bin')
+
+        # default fields are unaffected.
+        field_values = slurp_fields_from_readme(readme_content)
+        assert_equal(list(field_values.keys()), gd_diff.field_list)
+
+
+    def test_field_pattern(self):
+        pattern = field_pattern('Changed-From-Debian')
+        assert pattern is field_pattern('Changed-From-Debian')
+        assert pattern is not field_pattern('Upstream-Bug')
+
+        match = pattern.search('Changed-From-Debian: Branding.')
+        assert_equal(match.groups(), ('Branding.',))
+
 
     def test_get_wiki_page_data(self):
         def mock_mk_pkgs_list(r):
@@ -426,6 +916,36 @@ class TestGdDiff(object):
         assert_equal(columns[3] , '[[http://bzr.savannah.gnu.org/lh/gnewsense/packages-ucclia/antlr/annotate/head:/debian/README.gNewSense|more_info]]')
 
 
+    def test_iter_wiki_table_extra_fields(self):
+        mock_sys_argv = ['gd-diff', '--field', 'Upstream-Bug', '--field',
+                         'Removed-Files', '--field', 'Change-Type',
+                         'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+        default_fields = list(field_list)
+
+        fields = get_fields(args)
+        assert_equal(fields, default_fields + ['Upstream-Bug',
+                                               'Removed-Files'])
+        assert_equal(get_fetch_opts(args)['fields'], fields)
+        assert_equal(field_list, default_fields)
+
+        content = ('Change-Type: Modified\n'
+                   'Changed-From-Debian: Removed docs\n'
+                   'Removed-Files: doc/manual.pdf\n')
+        table_data = [('antlr', slurp_fields_from_readme(content, fields))]
+        row, = iter_wiki_table('ucclia', table_data)
+        columns = row.strip().split('||')[1:-1]
+        assert_equal(columns[:5], ['antlr', 'Modified', 'Removed docs', ' ',
+                                   'doc/manual.pdf'])
+        assert columns[5].endswith('|more_info]]')
+
+        # rows slurped with the default fields have no extra columns.
+        table_data = [('antlr', slurp_fields_from_readme(content))]
+        row, = iter_wiki_table('ucclia', table_data)
+        assert_equal(len(row.strip().split('||')[1:-1]), 4)
+
+
     def test_generate_wiki_table(self):
         def mock_mk_pkgs_list(r):
             return self.tiny_pkgs_file
@@ -465,6 +985,16 @@ class TestGdDiff(object):
         assert header == expected_header
 
 
+    def test_import_is_lazy(self):
+        code = ('import sys, gd_diff; print(" ".join(m for m in {!r} '
+                'if m in sys.modules))').format(
+                    ['asyncio', 'pkg_resources', 'requests', 'sqlite3',
+                     'urllib3', 'xmlrpc.client'])
+        cp = subprocess.run([sys.executable, '-c', code],
+                            stdout=subprocess.PIPE, check=True)
+        assert_equal(cp.stdout.decode().strip(), '')
+
+
     def test_generate_wiki_page(self):
         def mock_mk_pkgs_list(r):
             return self.tiny_pkgs_file
@@ -477,6 +1007,737 @@ class TestGdDiff(object):
             assert wiki_page == gns_wiki_header() + '\n' + wiki_table
 
 
+    def test_generate_wiki_page_fake_bzr(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        expected_rows = [
+            construct_table_row('parkes', 'antlr', 'Modified',
+                                'Removed example with non-free files.'),
+            construct_table_row('parkes', 'db4.8', 'Deblob',
+                                'Removed non-free documentation.'),
+        ]
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            pkgs_noreadmes, wiki_page = generate_wiki_page('parkes', jobs=4)
+
+            pkgs = read_packages(self.tiny_pkgs_file)
+            assert_equal(len(pkgs_noreadmes), len(pkgs) - 2)
+            assert_equal(wiki_page, gns_wiki_header() + '\n' +
+                         '\n'.join(expected_rows) + '\n')
+
+            # stream the table data to a file.
+            with open(self.test_w_file, 'w') as f:
+                write_wiki_page_stream(f, 'parkes',
+                                       iter_table_data('parkes', pkgs))
+            assert_equal(read_file(self.test_w_file), wiki_page)
+
+
+    def test_execute_hedged(self):
+        hang = path.join(self.test_home, 'hang')
+        url = 'bzr://bzr.savannah.gnu.org/gnewsense/packages-parkes/antlr/' \
+              'debian/README.gNewSense'
+        expected = read_file(path.join('tests/files/bzr-repo/gnewsense',
+                                       'packages-parkes/antlr/debian',
+                                       'README.gNewSense'))
+
+        with mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_HANG': hang}):
+            stats.reset()
+            start = time.monotonic()
+            assert_equal(execute_hedged('bzr cat {}'.format(url), 0.5), None)
+            assert time.monotonic() - start < 10
+
+            # the hedge started after 0.2 seconds wins over the hung
+            # command.
+            os.remove(hang)
+            cp = execute_hedged('bzr cat {}'.format(url), 30, 0.2)
+            assert time.monotonic() - start < 10
+            assert_equal(cp.stdout.decode(), expected)
+            counters = stats.report()['counters']
+            assert_equal((counters['hedges'], counters['hedge_wins']),
+                         (1, 1))
+
+
+    def test_fetch_policy(self):
+        hang = path.join(self.test_home, 'hang')
+
+        with mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_HANG': hang}), \
+             mock.patch('gd_diff.fetch_backoff', new=0), \
+             mock.patch('sys.stderr', new=StringIO()):
+            stats.reset()
+            backend = BzrBackend(policy=FetchPolicy(timeout=0.5))
+            assert_equal(backend.cat_readme('parkes', 'antlr'), None)
+
+            # the hung command is killed and retried.
+            os.remove(hang)
+            backend = BzrBackend(policy=FetchPolicy(timeout=0.5, retries=1))
+            assert_equal(backend.cat_readme('parkes', 'antlr'),
+                         BzrBackend().cat_readme('parkes', 'antlr'))
+            counters = stats.report()['counters']
+            assert_equal((counters['fetch_timeouts'],
+                          counters['fetch_retries']), (2, 1))
+
+        policy = FetchPolicy(hedge=True)
+        for i in range(1, gd_diff.hedge_min_samples):
+            policy.observe(i)
+        assert_equal(policy.hedge_delay, None)
+        policy.observe(100)
+        assert_equal(policy.hedge_delay, 19)
+
+
+    def test_adaptive_limiter(self):
+        def fetch(limiter, latency, errors=0):
+            limiter.acquire()
+            limiter.release(latency, errors)
+
+        with mock.patch('gd_diff.adaptive_window', new=4):
+            stats.reset()
+            limiter = AdaptiveLimiter(16)
+            assert_equal(limiter.limit, 1)
+
+            # slow start.
+            for limit in [2, 4, 8]:
+                for _ in range(4):
+                    fetch(limiter, 1.0)
+                assert_equal(limiter.limit, limit)
+
+            # an error halves the limit at once.
+            fetch(limiter, 1.0, errors=1)
+            assert_equal(limiter.limit, 4)
+
+            # additive increase.
+            for _ in range(4):
+                fetch(limiter, 1.5)
+            assert_equal(limiter.limit, 5)
+
+            # rising latency.
+            for _ in range(4):
+                fetch(limiter, 2.5)
+            assert_equal(limiter.limit, 2)
+
+            assert_equal(stats.report()['gauges']['concurrency_limit'],
+                         {'last': 2, 'min': 1, 'max': 8})
+
+            # the limit stays within bounds.
+            limiter = AdaptiveLimiter(3)
+            for _ in range(12):
+                fetch(limiter, 1.0)
+            assert_equal(limiter.limit, 3)
+            for _ in range(3):
+                fetch(limiter, 1.0, errors=1)
+            assert_equal(limiter.limit, 1)
+
+            # errors of the fetch are reported; so are exceptions.
+            def failing():
+                note_fetch_error()
+            limiter.run(failing)
+            assert_equal(limiter.limit, 1)
+            assert_raises(ZeroDivisionError, limiter.run, lambda: 1 / 0)
+            assert_equal(limiter.inflight, 0)
+
+            # only fetches that made a request are sampled.
+            limiter.run(lambda: None)
+            assert_equal(limiter.recent, [])
+            limiter.run(note_fetch_request)
+            assert_equal(len(limiter.recent), 1)
+
+            # errors of fetches in flight together halve the limit once;
+            # their latencies are not sampled either.
+            limiter = AdaptiveLimiter(16)
+            limiter.set_limit(8)
+            epochs = [limiter.acquire() for _ in range(5)]
+            for epoch in epochs[:4]:
+                limiter.release(1.0, 1, epoch)
+            assert_equal(limiter.limit, 4)
+            limiter.release(1.0, 0, epochs[4])
+            assert_equal(limiter.recent, [])
+            limiter.release(1.0, 1, limiter.acquire())
+            assert_equal(limiter.limit, 2)
+
+        # the baseline follows a lasting rise in latency.
+        with mock.patch('gd_diff.adaptive_window', new=4), \
+             mock.patch('gd_diff.baseline_windows', new=2):
+            limiter = AdaptiveLimiter(16)
+            for latency, limit in [(1.0, 2), (3.0, 1), (3.0, 2)]:
+                for _ in range(4):
+                    fetch(limiter, latency)
+                assert_equal(limiter.limit, limit)
+
+
+    def test_adaptive_limiter_congestion(self):
+        congestion = path.join(self.test_home, 'congestion')
+        os.mkdir(congestion)
+        pkgs = ['pkg-{}'.format(i) for i in range(48)]
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {
+                 'PATH': self.fake_bzr_path,
+                 'FAKE_BZR_CONGESTION': '{}:2:0.05'.format(congestion)}), \
+             mock.patch('gd_diff.adaptive_window', new=6), \
+             mock.patch('sys.stderr', new=StringIO()):
+            stats.reset()
+            limiter = AdaptiveLimiter(16)
+            pkgs_noreadmes = slurp_all_gns_readmes('parkes', pkgs, jobs=16,
+                                                   limiter=limiter)
+
+        assert_equal(pkgs_noreadmes, pkgs)
+        # it grew while the fake bzr kept up, but backed off long before
+        # 16 commands at once made each 8 times slower.
+        gauge = stats.report()['gauges']['concurrency_limit']
+        assert 2 <= gauge['max'] <= 8, gauge
+        assert gauge['last'] < 8, gauge
+
+
+    def test_open_backend(self):
+        assert isinstance(open_backend('bzr'), BzrBackend)
+
+        with mock.patch('gd_diff.import_breezy', side_effect=ImportError), \
+             mock.patch('sys.stderr', new=StringIO()) as err:
+            assert isinstance(open_backend('auto'), BzrBackend)
+            assert_equal(err.getvalue(), '')
+
+            assert isinstance(open_backend('breezy'), BzrBackend)
+            assert_equal(err.getvalue(), 'breezy is not installed; using bzr\n')
+
+
+    def test_breezy_backend(self):
+        root = make_bzr_branches('tests/files/bzr-repo',
+                                 path.join(self.test_home, 'bzr-repo'))
+        branch_url = 'file://' + root + '/gnewsense/packages-{}/{}'
+
+        with mock.patch('gd_diff.branch_url_fmt', new=branch_url):
+            backend = open_backend('breezy')
+            assert isinstance(backend, BreezyBackend)
+
+            assert backend.cat_readme('parkes', 'db4.8').startswith(
+                b'Changed-From-Debian: Removed non-free documentation.')
+            assert_equal(backend.cat_readme('parkes', 'debian-cd'), None)
+            assert_equal(backend.cat_readme('parkes', 'nonexistent'), None)
+
+            revid = backend.revision_id('parkes', 'antlr')
+            assert revid.startswith('gd-diff@example.org-')
+            assert_equal(backend.revision_id('parkes', 'nonexistent'), None)
+            backend.close()
+
+
+    def test_backend_fetch_errors(self):
+        root = make_bzr_branches('tests/files/bzr-repo',
+                                 path.join(self.test_home, 'bzr-repo'))
+        branch_url = 'file://' + root + '/gnewsense/packages-{}/{}'
+
+        for name in ['bzr', 'breezy', 'helper']:
+            with mock.patch.dict('os.environ',
+                                 {'PATH': self.fake_bzr_path}), \
+                 mock.patch('gd_diff.branch_url_fmt', new=branch_url):
+                backend = open_backend(name)
+                # a missing branch or file is not an error.
+                errors = fetch_errors()
+                assert_equal(backend.cat_readme('parkes', 'debian-cd'), None)
+                assert_equal(backend.cat_readme('parkes', 'nonexistent'),
+                             None)
+                assert_equal(fetch_errors(), errors)
+
+            if name == 'bzr':
+                continue
+            with mock.patch('gd_diff.branch_url_fmt',
+                            new='nosuchscheme://example.org/{}/{}'):
+                assert_equal(backend.cat_readme('parkes', 'antlr'), None)
+                assert_equal(backend.revision_id('parkes', 'antlr'), None)
+                assert_equal(fetch_errors(), errors + 2, name)
+                backend.close()
+
+        def cp(returncode, stderr):
+            return subprocess.CompletedProcess([], returncode, b'', stderr)
+
+        assert not bzr_failed(cp(0, b''))
+        assert not bzr_failed(cp(3, b'bzr: ERROR: Not a branch: "url".'))
+        assert not bzr_failed(cp(3, b'bzr: ERROR: "debian/README.gNewSense" '
+                                 b'is not present in revision 1.'))
+        assert bzr_failed(cp(3, b'bzr: ERROR: Connection error: timed out'))
+        assert bzr_failed(cp(-9, b''))
+
+
+    def test_helper_backend(self):
+        root = make_bzr_branches('tests/files/bzr-repo',
+                                 path.join(self.test_home, 'bzr-repo'))
+        branch_url = 'file://' + root + '/gnewsense/packages-{}/{}'
+
+        with mock.patch('gd_diff.branch_url_fmt', new=branch_url):
+            backend = open_backend('helper', jobs=2)
+            assert isinstance(backend, HelperBackend)
+            pids = [p.pid for p in backend.procs]
+            assert_equal(len(pids), 2)
+
+            for _ in range(3):
+                assert backend.cat_readme('parkes', 'db4.8').startswith(
+                    b'Changed-From-Debian: Removed non-free documentation.')
+                assert_equal(backend.cat_readme('parkes', 'debian-cd'), None)
+                assert_equal(backend.cat_readme('parkes', 'nonexistent'),
+                             None)
+            assert_equal(backend.revision_id('parkes', 'antlr'),
+                         BreezyBackend().revision_id('parkes', 'antlr'))
+
+            # helpers are reused; a dead one is replaced.
+            assert_equal([p.pid for p in backend.procs], pids)
+            backend.procs[0].kill()
+            backend.procs[0].wait()
+            for _ in range(2):
+                assert backend.cat_readme('parkes', 'antlr') is not None
+            assert_equal(len(backend.procs), 2)
+            assert pids[0] not in [p.pid for p in backend.procs]
+
+            # helpers that cannot be restarted leave the pool; their
+            # requests are read with bzr.
+            backend.python = 'false'
+            for p in backend.procs:
+                p.kill()
+                p.wait()
+            with mock.patch.dict('os.environ',
+                                 {'PATH': self.fake_bzr_path}), \
+                 mock.patch('sys.stderr', new=StringIO()) as err:
+                for _ in range(3):
+                    assert backend.cat_readme('parkes', 'db4.8').startswith(
+                        b'Changed-From-Debian: Removed non-free '
+                        b'documentation.')
+                    assert_equal(backend.cat_readme('parkes', 'debian-cd'),
+                                 None)
+            assert_equal(backend.procs, [])
+            assert_equal(err.getvalue(), 'bzr helper failed to start: '
+                         'exit status 1; using bzr\n')
+            backend.close()
+            assert_equal(backend.procs, [])
+
+
+    def test_open_backend_helper_fails(self):
+        with mock.patch('sys.stderr', new=StringIO()) as err:
+            backend = open_backend('helper', python='false')
+            assert isinstance(backend, BzrBackend)
+            assert_equal(err.getvalue(), 'bzr helper failed to start: '
+                         'exit status 1; using bzr\n')
+
+
+    def test_generate_wiki_page_breezy(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        root = make_bzr_branches('tests/files/bzr-repo',
+                                 path.join(self.test_home, 'bzr-repo'))
+        branch_url = 'file://' + root + '/gnewsense/packages-{}/{}'
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_ROOT': root}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            expected = generate_wiki_page('parkes', backend=BzrBackend())
+
+            with mock.patch('gd_diff.branch_url_fmt', new=branch_url):
+                backend = BreezyBackend()
+                helper = HelperBackend(2)
+                for b in [backend, helper]:
+                    for pipeline in [False, True]:
+                        page = generate_wiki_page('parkes', jobs=4,
+                                                  pipeline=pipeline,
+                                                  incremental=not pipeline,
+                                                  backend=b)
+                        assert_equal(page, expected)
+                    b.close()
+
+
+    def test_loggerhead_backend(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        server = serve_http(LoggerheadHandler)
+        download_url = '/'.join([server.url, 'lh', 'gnewsense',
+                                 'packages-{}', '{}', 'download', 'head:',
+                                 'debian', 'README.gNewSense'])
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.readme_download_fmt', new=download_url), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()) as err:
+            expected = generate_wiki_page('parkes', backend=BzrBackend())
+
+            backend = open_backend('loggerhead')
+            assert isinstance(backend, LoggerheadBackend)
+            assert_equal(backend.cat_readme('parkes', 'db4.8'),
+                         BzrBackend().cat_readme('parkes', 'db4.8'))
+            assert_equal(backend.cat_readme('parkes', 'debian-cd'), None)
+            assert_equal(backend.revision_id('parkes', 'antlr'), None)
+
+            LoggerheadHandler.ports = []
+            page = generate_wiki_page('parkes', jobs=4, backend=backend)
+            assert_equal(page, expected)
+
+            # connections are reused.
+            pkgs = read_packages(self.tiny_pkgs_file)
+            assert_equal(len(LoggerheadHandler.ports), len(pkgs))
+            assert len(set(LoggerheadHandler.ports)) <= 4
+
+            # errors other than 404 are reported.
+            errors = fetch_errors()
+            with mock.patch('gd_diff.readme_download_fmt',
+                            new=server.url + '/{}/{}'):
+                assert_equal(backend.cat_readme('parkes', 'antlr'), None)
+            assert err.getvalue().endswith('/parkes/antlr: 403\n')
+            assert_equal(fetch_errors(), errors + 1)
+            server.shutdown()
+
+
+    def test_mirror_release(self):
+        def mock_get_packages(r):
+            return 'antlr\ndb4.8\ndebian-cd\n'
+
+        root = make_bzr_branches('tests/files/bzr-repo',
+                                 path.join(self.test_home, 'bzr-repo'))
+        branch_url = 'file://' + root + '/gnewsense/packages-{}/{}'
+
+        # run breezy's brz as bzr.
+        brz = shutil.which('brz')
+        if brz is None:
+            raise SkipTest('brz is not installed')
+        bin_dir = path.join(self.test_home, 'bin')
+        os.mkdir(bin_dir)
+        os.symlink(brz, path.join(bin_dir, 'bzr'))
+        env = {'PATH': os.pathsep.join([bin_dir, os.environ['PATH']]),
+               'BRZ_EMAIL': 'gd-diff <gd-diff@example.org>'}
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', env), \
+             mock.patch('gd_diff.branch_url_fmt', new=branch_url), \
+             mock.patch('gd_diff.get_packages', new=mock_get_packages), \
+             mock.patch('sys.stdout', new=StringIO()) as out, \
+             mock.patch('sys.stderr', new=StringIO()):
+            expected = generate_wiki_page('parkes', backend=BzrBackend())
+
+            pkgs = ['antlr', 'db4.8']
+            assert_equal(mirror_release('parkes', pkgs, jobs=2), [])
+            md = mirror_dir('parkes')
+            for pkg in pkgs:
+                assert 'Mirrored {}'.format(path.join(md, pkg)) in \
+                    out.getvalue()
+            assert not path.exists(path.join(md, 'antlr', 'debian'))
+
+            # only mirrored branches are read.
+            for name in ['bzr', 'breezy']:
+                backend = open_backend(name, mirror=md)
+                assert_equal(backend.cat_readme('parkes', 'db4.8'),
+                             BzrBackend().cat_readme('parkes', 'db4.8'))
+                assert_equal(backend.cat_readme('parkes', 'debian-cd'), None)
+                backend.close()
+
+            # new branches are mirrored, existing ones updated.
+            readme = path.join(root, 'gnewsense', 'packages-parkes',
+                               'db4.8', 'debian', 'README.gNewSense')
+            write_file(readme, 'Changed-From-Debian: Removed blobs.\n'
+                       'Change-Type: Deblob\n')
+            execute('bzr commit -q -m Update {}'.format(path.dirname(readme)))
+
+            args = mock.Mock(release='parkes', jobs=2)
+            pkgs = mirror(args)
+            assert 'Updated {}'.format(path.join(md, 'db4.8')) in \
+                out.getvalue()
+            assert_equal(pkgs[-1], '')
+            assert_equal(sorted(os.listdir(md)),
+                         ['.bzr', 'antlr', 'db4.8', 'debian-cd'])
+
+            for name in ['bzr', 'breezy']:
+                backend = open_backend(name, mirror=md)
+                assert_equal(generate_wiki_page('parkes', backend=backend),
+                             generate_wiki_page('parkes',
+                                                backend=BzrBackend()))
+                backend.close()
+            assert_not_equal(expected[1], generate_wiki_page('parkes')[1])
+
+
+    def test_generate_wiki_page_stats(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        stats_file = path.join(self.test_home, 'stats.json')
+        mock_sys_argv = ['gd-diff', '--stats', stats_file, '--incremental',
+                         'parkes', '3']
+
+        def mock_make_push(args):
+            for _ in range(2):
+                generate_wiki_page(args.release,
+                                   incremental=args.incremental)
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('gd_diff.make_push', new=mock_make_push), \
+             mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            stats.reset()
+            main()
+
+        report = json.loads(read_file(stats_file))
+        pkgs = read_packages(self.tiny_pkgs_file)
+        counters = report['counters']
+        # revision-info for every package; on the second run, no cat
+        # for the three packages with a branch: two unchanged READMEs
+        # and debian-cd, known to lack one at its revision.
+        assert_equal(counters['subprocesses'], 2 * len(pkgs) +
+                     2 * len(pkgs) - 3)
+        assert_equal(counters['readme_cache_hits'], 3)
+        assert_equal(counters['readme_cache_misses'], 2 * len(pkgs) - 3)
+        assert_equal(counters['readmes_fetched'], 2)
+        assert_equal(counters['readmes_missing'], 2 * (len(pkgs) - 2) - 1)
+        assert counters['bytes_fetched'] > 0
+        assert_equal(report['latencies']['fetch']['count'], 2 * len(pkgs))
+        assert 'p99' in report['latencies']['fetch']
+        assert_equal(report['phases']['generate_wiki_page']['calls'], 2)
+        assert_equal(report['phases']['iter_wiki_page_data']['calls'], 2)
+        assert_equal(report['phases']['iter_table_data']['calls'], 2)
+        # the two READMEs are parsed on each run.
+        assert_equal(report['phases']['parse_readme']['calls'], 4)
+
+
+    def test_journal(self):
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch('sys.stdout', new=StringIO()):
+            jpath = journal_path('parkes')
+            journal = Journal(jpath)
+            journal.record_listed('/tmp/parkes.list')
+            journal.record('antlr', True)
+            journal.record('debian-cd', False)
+            journal.record('db4.8', True)
+            journal.close()
+
+            # a new run starts afresh.
+            journal = Journal(jpath)
+            journal.close()
+            assert_equal(read_file(jpath), '')
+
+            write_file(jpath, 'listed /tmp/parkes.list\nreadme antlr\n'
+                       'none debian-cd\nreadme db4.8\nnone apt')
+            journal = Journal(jpath, resume=True)
+            assert_equal(journal.pkgs_file, '/tmp/parkes.list')
+            assert_equal(journal.done, {'antlr': True, 'debian-cd': False,
+                                        'db4.8': True})
+
+            # READMEs missing from the store are fetched again.
+            save_gns_readme('Change-Type: Modified\n', 'parkes', 'antlr')
+            resumed = journal.resumed('parkes', ['antlr', 'apt', 'db4.8',
+                                                 'debian-cd'], TreeStore())
+            assert_equal(resumed, {'antlr': 'Change-Type: Modified\n',
+                                   'debian-cd': None})
+
+            journal.record('apt', False)
+            journal.remove()
+            assert not path.exists(jpath)
+
+            # the torn line is not glued to the next record.
+            write_file(jpath, 'readme antlr\nnone ap')
+            journal = Journal(jpath, resume=True)
+            journal.record('apt', False)
+            journal.close()
+            assert_equal(read_file(jpath), 'readme antlr\nnone ap\nnone apt\n')
+
+
+    def test_generate_wiki_page_resume(self):
+        pkgs = read_packages(self.tiny_pkgs_file)
+        listed = []
+        def mock_mk_pkgs_list(r):
+            listed.append(r)
+            return self.tiny_pkgs_file
+
+        class CrashingBackend(BzrBackend):
+            cats = []
+            crash = None
+
+            def cat_readme(self, release, pkg):
+                if pkg == self.crash:
+                    sys.exit(1)
+                self.cats.append(pkg)
+                return super().cat_readme(release, pkg)
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            expected = generate_wiki_page('parkes')
+
+            for pipeline in [False, True]:
+                rmtree(readmes_dir('parkes'))
+                listed.clear()
+                CrashingBackend.cats = []
+                CrashingBackend.crash = pkgs[5]
+
+                journal = Journal(journal_path('parkes'))
+                assert_raises(SystemExit, generate_wiki_page, 'parkes',
+                              backend=CrashingBackend(), journal=journal,
+                              pipeline=pipeline)
+                journal.close()
+                assert_equal(CrashingBackend.cats, pkgs[:5])
+
+                CrashingBackend.cats = []
+                CrashingBackend.crash = None
+                journal = Journal(journal_path('parkes'), resume=True)
+                page = generate_wiki_page('parkes', jobs=4,
+                                          backend=CrashingBackend(),
+                                          journal=journal,
+                                          pipeline=pipeline)
+                journal.close()
+                assert_equal(page, expected)
+                assert_equal(sorted(CrashingBackend.cats), sorted(pkgs[5:]))
+                assert_equal(listed, ['parkes'])
+
+
+    def test_negative_cache(self):
+        with mock.patch('os.getenv', new=self.env_func):
+            cpath = negative_cache_path('parkes')
+
+        nc = NegativeCache(cpath, ttl=3600)
+        assert not nc.absent('apt')
+        nc.update('apt', False, 'rev-1')
+        nc.update('antlr', True, 'rev-1')
+        assert nc.absent('apt')
+        assert nc.absent('apt', 'rev-2')
+        assert not nc.absent('antlr')
+        nc.save()
+
+        nc = NegativeCache(cpath, ttl=3600, check_revid=True)
+        assert nc.absent('apt', 'rev-1')
+        assert not nc.absent('apt', 'rev-2')
+        assert not nc.absent('apt')
+
+        # README added.
+        nc.update('apt', True, 'rev-2')
+        assert not nc.absent('apt', 'rev-2')
+
+        # expired entries are neither used nor saved.
+        nc.update('apt', False)
+        with mock.patch('time.time', return_value=time.time() + 3601):
+            assert not NegativeCache(cpath, ttl=3600).absent('apt')
+            nc.save()
+        assert_equal(json.loads(read_file(cpath)), {})
+
+        write_file(cpath, '{"apt": ')
+        assert_equal(NegativeCache(cpath, ttl=3600).entries, {})
+
+
+    def test_generate_wiki_page_negative_cache(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        pkgs = read_packages(self.tiny_pkgs_file)
+        bzr_root = path.join(self.test_home, 'bzr-repo')
+        copytree('tests/files/bzr-repo', bzr_root)
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_ROOT': bzr_root}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            cpath = negative_cache_path('parkes')
+            expected = generate_wiki_page('parkes')
+
+            for engine in ['threads', 'asyncio']:
+                nc = NegativeCache(cpath, ttl=3600)
+                stats.reset()
+                assert_equal(generate_wiki_page('parkes', engine=engine,
+                                                negative=nc), expected)
+                assert_equal(stats.counters['subprocesses'], len(pkgs))
+                nc.save()
+
+                # only packages with a README are fetched.
+                nc = NegativeCache(cpath, ttl=3600)
+                stats.reset()
+                assert_equal(generate_wiki_page('parkes', engine=engine,
+                                                jobs=4, negative=nc),
+                             expected)
+                assert_equal(stats.counters['subprocesses'], 2)
+                assert_equal(stats.counters['negative_cache_hits'],
+                             len(pkgs) - 2)
+                os.remove(cpath)
+
+                # failed fetches are not cached.
+                nc = NegativeCache(cpath, ttl=3600)
+                with mock.patch.dict('os.environ', {'FAKE_BZR_FAIL': 'cat'}):
+                    generate_wiki_page('parkes', engine=engine, negative=nc)
+                assert_equal(nc.entries, {})
+
+            # with revisions checked, only debian-cd, the one package
+            # without a README that has a branch, is known absent.
+            nc = NegativeCache(cpath, ttl=3600, check_revid=True)
+            generate_wiki_page('parkes', negative=nc)
+            stats.reset()
+            assert_equal(generate_wiki_page('parkes', negative=nc), expected)
+            assert_equal(stats.counters['negative_cache_hits'], 1)
+
+            # a README added to it is picked up.
+            readme = path.join(bzr_root, 'gnewsense', 'packages-parkes',
+                               'debian-cd', 'debian', 'README.gNewSense')
+            write_file(readme, 'Changed-From-Debian: Rebranded.\n'
+                       'Change-Type: Modified\n')
+
+            stats.reset()
+            pkgs_noreadmes, page = generate_wiki_page('parkes', negative=nc)
+            assert_equal(stats.counters.get('negative_cache_hits', 0), 0)
+            assert 'debian-cd' not in pkgs_noreadmes
+            assert 'Rebranded.' in page
+
+
+    def test_generate_wiki_page_pipeline(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('sys.stdout', new=StringIO()) as output, \
+             mock.patch('sys.stderr', new=StringIO()):
+            pkgs_noreadmes, wiki_page = generate_wiki_page('parkes')
+
+            # not saved.
+            rmtree(readmes_dir('parkes'))
+            stats.reset()
+            with mock.patch('gd_diff.read_gns_readme') as rgr:
+                pipelined = generate_wiki_page('parkes', pipeline=True,
+                                               save=False, jobs=4)
+                assert_equal(rgr.call_count, 0)
+            assert_equal(pipelined, (pkgs_noreadmes, wiki_page))
+            # the READMEs of antlr and db4.8 were parsed as they arrived.
+            phases = stats.report()['phases']
+            assert_equal(phases['parse_readme']['calls'], 2)
+            assert_equal(phases['iter_wiki_page_data']['calls'], 1)
+            assert 'iter_table_data' not in phases
+            assert_equal(read_gns_readme('parkes', 'antlr'), None)
+
+            # saved in the background.
+            pipelined = generate_wiki_page('parkes', pipeline=True,
+                                           engine='asyncio', jobs=4)
+            assert_equal(pipelined, (pkgs_noreadmes, wiki_page))
+            assert read_gns_readme('parkes', 'antlr').startswith(
+                'Changed-From-Debian: Removed')
+            assert read_gns_readme('parkes', 'db4.8').startswith(
+                'Changed-From-Debian: Removed')
+
+            # saved to the sqlite store.
+            store = open_readme_store('sqlite')
+            for pipeline in [True, False]:
+                page = generate_wiki_page('parkes', pipeline=pipeline,
+                                          jobs=4, store=store)
+                assert_equal(page, (pkgs_noreadmes, wiki_page))
+            assert_equal(store.pkgs('parkes'), ['antlr', 'db4.8'])
+            store.close()
+
+
     def test_read_wiki_page_returns_none_if_wikipage_nonexistent(self):
         with mock.patch('os.getenv', new=self.env_func):
             wiki_page_content = read_wiki_page('bogus-release')
@@ -549,7 +1810,7 @@ class TestGdDiff(object):
         # mock `generate_wiki_page` function
         expected_wiki_page = 'wiki content.'
         expected_pkgs_noreadmes = ['noreadmepkg']
-        def mock_gwg(r):
+        def mock_gwg(r, **kwargs):
             return expected_pkgs_noreadmes, expected_wiki_page
 
         # mock `configured_p` function
@@ -569,9 +1830,10 @@ class TestGdDiff(object):
         def mock_wwp(r, wp):
             return
 
-        # mock `push_wiki_page`
-        def mock_pwp(u, usr, p, v, wp):
-            return
+        # mock `push_wiki_pages`
+        pushed_pages = []
+        def mock_pwp(u, usr, p, pages):
+            pushed_pages.extend(pages)
 
         with mock.patch('os.getenv', new=self.env_func), \
              mock.patch('gd_diff.read_wiki_page', new=mock_rwp), \
@@ -580,15 +1842,397 @@ class TestGdDiff(object):
              mock.patch('gd_diff.configure', new=mock_c), \
              mock.patch('gd_diff.read_config_file', new=mock_rcf), \
              mock.patch('gd_diff.write_wiki_page', new=mock_wwp), \
-             mock.patch('gd_diff.push_wiki_page', new=mock_pwp), \
+             mock.patch('gd_diff.push_wiki_pages', new=mock_pwp), \
              mock.patch('sys.argv', new=mock_sys_argv):
             args = get_args()
-            config, pkgs_noreadmes, old_wiki_page, wiki_page = make_push(args)
+            config, pushed = make_push(args)
+            release, pkgs_noreadmes, old_wiki_page, wiki_page = pushed[0]
 
             assert expected_config == config
+            assert release == 'parkes'
             assert expected_pkgs_noreadmes == pkgs_noreadmes
             assert expected_old_wiki_page == old_wiki_page
             assert expected_wiki_page == wiki_page
+            assert pushed_pages == [(3, expected_wiki_page)]
+
+            # the run is complete.
+            assert not path.exists(journal_path('parkes'))
+
+
+    def test_make_push_fingerprint(self):
+        pkgs_file = path.join(self.test_home, 'pkgs.list')
+        write_file(pkgs_file, 'antlr\ndb4.8\ndebian-cd\n')
+        bzr_root = path.join(self.test_home, 'bzr-repo')
+        copytree('tests/files/bzr-repo', bzr_root)
+
+        pushed = []
+        generated = []
+        def mock_gwp(r, **kwargs):
+            generated.append(r)
+            return generate_wiki_page(r, **kwargs)
+
+        mock_sys_argv = ['gd-diff', '--fingerprint', '--backend', 'bzr',
+                         'parkes', '3']
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_ROOT': bzr_root}), \
+             mock.patch('gd_diff.mk_pkgs_list', return_value=pkgs_file), \
+             mock.patch('gd_diff.generate_wiki_page', new=mock_gwp), \
+             mock.patch('gd_diff.configured_p', return_value=True), \
+             mock.patch('gd_diff.read_config_file',
+                        return_value={'user': 'u', 'pass': 'p'}), \
+             mock.patch('gd_diff.push_wiki_pages',
+                        new=lambda *args: pushed.append(args)), \
+             mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stdout', new=StringIO()) as out, \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+            make_push(args)
+            assert_equal((len(generated), len(pushed)), (1, 1))
+            fingerprint = read_wiki_fingerprint('parkes')
+            assert_equal(len(fingerprint), 40)
+
+            # nothing changed; the page is not generated.
+            assert_equal(make_push(args), None)
+            assert_equal((len(generated), len(pushed)), (1, 1))
+            assert out.getvalue().endswith('no changes.\n')
+
+            # a branch changed.
+            readme = path.join(bzr_root, 'gnewsense', 'packages-parkes',
+                               'db4.8', 'debian', 'README.gNewSense')
+            write_file(readme, 'Changed-From-Debian: Removed blobs.\n'
+                       'Change-Type: Deblob\n')
+            make_push(args)
+            assert_equal((len(generated), len(pushed)), (2, 2))
+            assert 'Removed blobs.' in read_wiki_page('parkes')
+            assert read_wiki_fingerprint('parkes') != fingerprint
+
+            # with --incremental, the revision ids read for the
+            # fingerprint are not read again. The empty name after the
+            # listing's trailing newline has no fingerprint revision id;
+            # it costs a revision-info and a cat on each run.
+            args.incremental = True
+            write_file(readme, 'Changed-From-Debian: Removed more blobs.\n'
+                       'Change-Type: Deblob\n')
+            stats.reset()
+            make_push(args)
+            assert_equal(stats.counters['subprocesses'], 3 + 3 + 2)
+            write_file(readme, 'Changed-From-Debian: Removed all blobs.\n'
+                       'Change-Type: Deblob\n')
+            stats.reset()
+            make_push(args)
+            assert_equal(stats.counters['subprocesses'], 3 + 1 + 2)
+            assert 'Removed all blobs.' in read_wiki_page('parkes')
+
+            # revision ids that cannot be read never match.
+            fingerprint, revids = input_fingerprint(
+                'parkes', self.tiny_pkgs_file, BzrBackend())
+            assert_equal(fingerprint, None)
+            assert_equal(sorted(revids), ['antlr', 'db4.8', 'debian-cd'])
+
+
+    def test_make_push_batch(self):
+        pkgs_file = path.join(self.test_home, 'pkgs.list')
+        write_file(pkgs_file, 'antlr\ndb4.8\ndebian-cd')
+        bzr_root = path.join(self.test_home, 'bzr-repo')
+        copytree('tests/files/bzr-repo', bzr_root)
+        copytree(path.join(bzr_root, 'gnewsense', 'packages-parkes'),
+                 path.join(bzr_root, 'gnewsense', 'packages-ucclia'))
+
+        executors = []
+        def mock_map_gns_readmes(release, pkgs, process, **kwargs):
+            executors.append(kwargs.get('executor'))
+            return map_gns_readmes(release, pkgs, process, **kwargs)
+
+        pushed = []
+        mock_sys_argv = ['gd-diff', '-j', '4', '--backend', 'bzr',
+                         'parkes:3', 'ucclia:2']
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_ROOT': bzr_root}), \
+             mock.patch('gd_diff.mk_pkgs_list', return_value=pkgs_file), \
+             mock.patch('gd_diff.map_gns_readmes',
+                        new=mock_map_gns_readmes), \
+             mock.patch('gd_diff.configured_p', return_value=True), \
+             mock.patch('gd_diff.read_config_file',
+                        return_value={'user': 'u', 'pass': 'p'}), \
+             mock.patch('gd_diff.push_wiki_pages',
+                        new=lambda *args: pushed.append(args)), \
+             mock.patch('gd_diff.open_readme_store',
+                        wraps=gd_diff.open_readme_store) as ors, \
+             mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stdout', new=StringIO()) as out, \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+            config, made = make_push(args)
+
+            # the store got the resolved paths of both releases.
+            store_paths = ors.call_args[0][1]
+            assert_equal(store_paths, [resolve_paths('parkes'),
+                                       resolve_paths('ucclia')])
+
+            # both releases were fetched by the same pool.
+            assert_equal(len(executors), 2)
+            assert executors[0] is not None
+            assert executors[0] is executors[1]
+
+            # and pushed at once.
+            assert_equal(len(pushed), 1)
+            pages = pushed[0][3]
+            assert_equal([version for version, _ in pages], [3, 2])
+            assert_equal([release for release, _, _, _ in made],
+                         ['parkes', 'ucclia'])
+            for release, pkgs_noreadmes, old_wiki_page, wiki_page in made:
+                assert_equal(pkgs_noreadmes, ['debian-cd'])
+                assert_equal(old_wiki_page, None)
+                assert_equal(read_wiki_page(release), wiki_page)
+                assert 'packages-{}/antlr'.format(release) in wiki_page
+            assert_equal(pages[1][1], made[1][3])
+
+            # nothing changed.
+            assert_equal(make_push(args), None)
+            assert_equal(len(pushed), 1)
+            assert_equal(out.getvalue().splitlines()[-2:],
+                         ['parkes: no changes.', 'ucclia: no changes.'])
+
+
+    def test_make_shard_merge(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        pushed = []
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('gd_diff.configured_p', return_value=True), \
+             mock.patch('gd_diff.read_config_file',
+                        return_value={'user': 'u', 'pass': 'p'}), \
+             mock.patch('gd_diff.push_wiki_pages',
+                        new=lambda *args: pushed.append(args)), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            expected = generate_wiki_page('parkes', backend=BzrBackend())
+
+            spaths = []
+            for k in [3, 1, 2]:
+                argv = ['gd-diff', '--shard', '{}/3'.format(k), '--backend',
+                        'bzr', 'parkes', '3']
+                with mock.patch('sys.argv', new=argv):
+                    args = get_args()
+                    assert_equal(args.func, make_shard)
+                    spaths.append(args.func(args))
+
+            shards = [json.loads(read_file(spath)) for spath in spaths]
+            pkgs = [pkg for shard in shards
+                    for _, pkg, _ in shard['table_data']]
+            assert_equal(sorted(pkgs), ['antlr', 'db4.8'])
+            for shard in shards:
+                for _, pkg, _ in shard['table_data']:
+                    assert_equal(pkg_shard(pkg, 3), shard['shard'])
+
+            # a shard is missing.
+            argv = ['gd-diff', 'merge', 'parkes', '3'] + spaths[1:]
+            with mock.patch('sys.argv', new=argv):
+                assert_raises(SystemExit, main)
+            assert_equal(pushed, [])
+
+            with mock.patch('sys.argv', new=['gd-diff', 'merge', 'parkes',
+                                             '3']):
+                config, pkgs_noreadmes, old_wiki_page, wiki_page = \
+                    get_args().func(get_args())
+
+            assert_equal(wiki_page, expected[1])
+            assert_equal(sorted(pkgs_noreadmes), sorted(expected[0]))
+            assert_equal(pushed, [(gns_wiki, 'u', 'p', [(3, wiki_page)])])
+            assert_equal(read_wiki_page('parkes'), wiki_page)
+
+
+    def test_work_queue(self):
+        with mock.patch('os.getenv', new=self.env_func):
+            work = WorkQueue(work_queue_path())
+            assert_equal(work.release_state('parkes'), None)
+            work.fill('parkes', ['antlr', 'db4.8', 'debian-cd'])
+            assert_equal(work.release_state('parkes'), 'open')
+            assert_equal(work.progress('parkes'),
+                         {'pending': 3, 'leased': 0, 'done': 0})
+
+            assert_equal(work.claim('parkes', 'w1', 60), 'antlr')
+            # w2's lease runs out at once.
+            assert_equal(work.claim('parkes', 'w2', -1), 'db4.8')
+            assert_equal(work.claim('parkes', 'w1', 60), 'db4.8')
+            assert_equal(work.claim('parkes', 'w1', 60), 'debian-cd')
+            assert_equal(work.claim('parkes', 'w1', 60), None)
+
+            # w2 lost its lease on db4.8 to w1.
+            assert_equal(work.complete('parkes', 'db4.8', 'w2', {}), False)
+            fields = {'Change-Type': 'Deblob', 'Changed-From-Debian': 'x'}
+            assert work.complete('parkes', 'db4.8', 'w1', fields)
+            assert work.complete('parkes', 'antlr', 'w1', {})
+            assert work.complete('parkes', 'debian-cd', 'w1', None)
+            assert_equal(work.progress('parkes'),
+                         {'pending': 0, 'leased': 0, 'done': 3})
+            assert_equal(work.results('parkes'),
+                         (['debian-cd'], [('antlr', {}), ('db4.8', fields)]))
+
+            work.finish('parkes')
+            assert_equal(work.release_state('parkes'), 'finished')
+
+            # refilling drops the earlier work and reopens the release.
+            assert_equal(work.fill('parkes', ['antlr']), 1)
+            assert_equal(work.progress('parkes'),
+                         {'pending': 1, 'leased': 0, 'done': 0})
+            assert_equal(work.release_state('parkes'), 'open')
+
+            # packages given twice are queued once.
+            assert_equal(work.fill('parkes', ['antlr', 'db4.8', 'antlr']), 2)
+            assert_equal(work.progress('parkes'),
+                         {'pending': 2, 'leased': 0, 'done': 0})
+            work.close()
+
+
+    def test_worker_before_fill(self):
+        def start_worker(*opts):
+            with mock.patch('sys.argv', new=[
+                    'gd-diff', 'worker', '--queue', queue, '-j', '2',
+                    '--backend', 'bzr'] + list(opts) + ['parkes']):
+                args = get_args()
+            completed = []
+            t = threading.Thread(
+                target=lambda: completed.append(args.func(args)))
+            t.start()
+            return t, completed
+
+        pkgs = read_packages(self.tiny_pkgs_file)
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.work_queue_poll', new=0.01), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            queue = work_queue_path()
+            work = WorkQueue(queue)
+
+            # with --wait, a worker gives up on a release never queued.
+            t, completed = start_worker('--wait', '0.05')
+            t.join(5)
+            assert not t.is_alive()
+            assert_equal(completed, [0])
+
+            # a worker started before the release is queued waits for
+            # it, and for the coordinator to finish it.
+            t, completed = start_worker()
+            time.sleep(0.1)
+            assert t.is_alive()
+            work.fill('parkes', pkgs)
+            while work.progress('parkes')['done'] < len(pkgs):
+                time.sleep(0.01)
+            time.sleep(0.1)
+            assert t.is_alive()
+
+            work.finish('parkes')
+            t.join(5)
+            assert not t.is_alive()
+            assert_equal(completed, [len(pkgs)])
+            work.close()
+
+
+    def test_worker_fetch_error(self):
+        pkgs = read_packages(self.tiny_pkgs_file)
+        mock_sys_argv = ['gd-diff', 'worker', '--wait', '0.1', '--backend',
+                         'bzr', 'parkes']
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path,
+                                            'FAKE_BZR_FAIL': 'cat'}), \
+             mock.patch('gd_diff.work_queue_poll', new=0.01), \
+             mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+            work = WorkQueue(work_queue_path())
+            work.fill('parkes', pkgs)
+
+            # failed fetches are left leased for another worker to retry
+            # once their leases run out.
+            assert_equal(args.func(args), 0)
+            assert_equal(work.progress('parkes'),
+                         {'pending': 0, 'leased': len(pkgs), 'done': 0})
+            assert_equal(work.claim('parkes', 'w1', 60), None)
+            with mock.patch('time.time', return_value=time.time() + 301):
+                assert_equal(work.claim('parkes', 'w1', 60), pkgs[0])
+            work.close()
+
+
+    def test_start_worker(self):
+        mock_sys_argv = ['gd-diff', '--coordinate', '--field', 'Upstream-Bug',
+                         'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('gd_diff.Popen') as popen:
+            args = get_args()
+            args.queue = 'queue.db'
+            start_worker(args)
+
+        cmd = popen.call_args[0][0]
+        assert_equal(cmd[:3], [sys.executable, path.abspath(gd_diff.__file__),
+                               'worker'])
+        assert_equal(cmd[-3:], ['--field', 'Upstream-Bug', 'parkes'])
+
+        # the module runs as a script.
+        cp = subprocess.run(cmd[:2] + ['--version'], stdout=subprocess.PIPE)
+        assert_equal(cp.stdout.decode().strip(), __version__)
+
+
+    def test_coordinate(self):
+        def mock_mk_pkgs_list(r):
+            return self.tiny_pkgs_file
+
+        class ThreadProc(object):
+            def __init__(self, target, *args):
+                self.thread = threading.Thread(target=target, args=args)
+                self.thread.start()
+
+            def poll(self):
+                return None if self.thread.is_alive() else 0
+
+            def wait(self):
+                self.thread.join()
+
+        def mock_start_worker(args):
+            with mock.patch('sys.argv', new=[
+                    'gd-diff', 'worker', '--queue', args.queue, '-j', '2',
+                    '--backend', 'bzr', args.release]):
+                worker_args = get_args()
+            return ThreadProc(worker_args.func, worker_args)
+
+        pushed = []
+        mock_sys_argv = ['gd-diff', '--coordinate', '--workers', '2',
+                         'parkes', '3']
+        with mock.patch('os.getenv', new=self.env_func), \
+             mock.patch.dict('os.environ', {'PATH': self.fake_bzr_path}), \
+             mock.patch('gd_diff.mk_pkgs_list', new=mock_mk_pkgs_list), \
+             mock.patch('gd_diff.start_worker', new=mock_start_worker), \
+             mock.patch('gd_diff.work_queue_poll', new=0.01), \
+             mock.patch('gd_diff.configured_p', return_value=True), \
+             mock.patch('gd_diff.read_config_file',
+                        return_value={'user': 'u', 'pass': 'p'}), \
+             mock.patch('gd_diff.push_wiki_pages',
+                        new=lambda *args: pushed.append(args)), \
+             mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stdout', new=StringIO()), \
+             mock.patch('sys.stderr', new=StringIO()):
+            expected = generate_wiki_page('parkes', backend=BzrBackend())
+
+            args = get_args()
+            assert_equal(args.func, coordinate)
+            config, pkgs_noreadmes, old_wiki_page, wiki_page = \
+                args.func(args)
+
+            assert_equal(wiki_page, expected[1])
+            assert_equal(pkgs_noreadmes, expected[0])
+            assert_equal(pushed, [(gns_wiki, 'u', 'p', [(3, wiki_page)])])
+
+            work = WorkQueue(work_queue_path())
+            pkgs = read_packages(self.tiny_pkgs_file)
+            assert_equal(work.progress('parkes')['done'], len(pkgs))
+            work.close()
 
 
     def test_get_args_gd_diff_version(self):
@@ -607,6 +2251,156 @@ class TestGdDiff(object):
             args = get_args()
             assert args.release == 'parkes'
             assert args.version == 3
+            assert args.pages == [('parkes', 3)]
+            assert args.jobs == 1
+            assert args.engine == 'threads'
+            assert args.rate == None
+            assert args.incremental == False
+            assert args.fields == []
+            assert args.pipeline == False
+            assert args.no_save == False
+            assert args.store == 'tree'
+            assert args.backend == 'auto'
+            assert args.helper_python == None
+            assert args.resume == False
+            assert args.fingerprint == False
+            assert args.negative_ttl == None
+            assert args.negative_revid == False
+            assert args.adaptive == False
+            assert args.func == make_push
+
+
+    def test_get_args_pages(self):
+        mock_sys_argv = ['gd-diff', 'parkes:3', 'ucclia:2']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+            assert_equal(args.pages, [('parkes', 3), ('ucclia', 2)])
+            assert_equal((args.release, args.version), (None, None))
+
+        for argv in [['parkes'], ['parkes', '3', 'ucclia'], ['parkes:x'],
+                     ['parkes:3', 'parkes:4']]:
+            with mock.patch('sys.argv', new=['gd-diff'] + argv), \
+                 mock.patch('sys.stderr', new=StringIO()):
+                assert_raises(SystemExit, get_args)
+
+
+    def test_get_args_fetch_policy(self):
+        mock_sys_argv = ['gd-diff', '--fetch-timeout', '30', '--hedge',
+                         'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+            assert_equal(args.backend, 'bzr')
+            policy = get_fetch_policy(args)
+            assert_equal((policy.timeout, policy.retries, policy.hedge),
+                         (30, 2, True))
+
+        with mock.patch('sys.argv', new=['gd-diff', 'parkes', '3']):
+            assert_equal(get_fetch_policy(get_args()), None)
+
+        with mock.patch('sys.argv', new=['gd-diff', 'worker', '--hedge',
+                                         'parkes']):
+            assert_equal(get_args().backend, 'bzr')
+
+        for argv in [['--backend', 'breezy', '--hedge'],
+                     ['--engine', 'asyncio', '--fetch-timeout', '5']]:
+            with mock.patch('sys.argv', new=['gd-diff'] + argv +
+                            ['parkes', '3']), \
+                 mock.patch('sys.stderr', new=StringIO()):
+                assert_raises(SystemExit, get_args)
+
+
+    def test_get_args_shard(self):
+        with mock.patch('sys.argv', new=['gd-diff', '--shard', '3/8',
+                                         'parkes', '3']):
+            args = get_args()
+            assert_equal(args.shard, (3, 8))
+            assert_equal(args.func, make_shard)
+
+        for argv in [['--shard', '0/8'], ['--shard', '9/8'],
+                     ['--shard', '3'], ['--shard', '1/2', '--fingerprint']]:
+            with mock.patch('sys.argv', new=['gd-diff'] + argv +
+                            ['parkes', '3']), \
+                 mock.patch('sys.stderr', new=StringIO()):
+                assert_raises(SystemExit, get_args)
+
+
+    @raises(SystemExit)
+    def test_get_args_mirror_loggerhead(self):
+        mock_sys_argv = ['gd-diff', '--mirror', '--backend', 'loggerhead',
+                         'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+
+
+    @raises(SystemExit)
+    def test_get_args_negative_revid_without_ttl(self):
+        mock_sys_argv = ['gd-diff', '--negative-revid', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+
+
+    @raises(SystemExit)
+    def test_get_args_no_save_resume(self):
+        mock_sys_argv = ['gd-diff', '--pipeline', '--no-save', '--resume',
+                         'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+
+
+    @raises(SystemExit)
+    def test_get_args_no_save_without_pipeline(self):
+        mock_sys_argv = ['gd-diff', '--no-save', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+
+
+    def test_get_args_fields(self):
+        mock_sys_argv = ['gd-diff', '--field', 'Upstream-Bug', '--field',
+                         'Removed-Files', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+            assert args.fields == ['Upstream-Bug', 'Removed-Files']
+
+
+    def test_get_args_jobs(self):
+        mock_sys_argv = ['gd-diff', '-j', '8', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+            assert args.jobs == 8
+
+
+    def test_get_args_engine(self):
+        mock_sys_argv = ['gd-diff', '--engine', 'asyncio', '--rate', '2.5',
+                         'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+            assert args.engine == 'asyncio'
+            assert args.rate == 2.5
+
+
+    @raises(SystemExit)
+    def test_get_args_rate_without_asyncio(self):
+        mock_sys_argv = ['gd-diff', '--rate', '2.5', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stderr', new=StringIO()):
+            args = get_args()
+
+
+    def test_get_args_engine_asyncio_backend(self):
+        mock_sys_argv = ['gd-diff', '--engine', 'asyncio', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv):
+            args = get_args()
+            assert args.backend == 'bzr'
+
+        mock_sys_argv = ['gd-diff', '--engine', 'asyncio', '--backend',
+                         'helper', 'parkes', '3']
+        with mock.patch('sys.argv', new=mock_sys_argv), \
+             mock.patch('sys.stderr', new=StringIO()):
+            assert_raises(SystemExit, get_args)
 
 
     def teardown(self):